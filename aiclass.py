@@ -10,13 +10,243 @@ Lynexus AI Assistant - Complete version with proper history management
 """
 
 from datetime import datetime
+import asyncio
+import functools
 import os
+import platform
+import re
 import sys
+import time
 import importlib.util
-import json
+import inspect
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
 from typing import List, Dict, Generator, Optional
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from mcp_utils import MCPServerManager, load_mcp_conf
+from utils.json_utils import dumps_json, loads_json, read_json
+
+logger = logging.getLogger(__name__)
+
+# 保护 load_mcp_mod 中 .py 工具模块的注册与执行（load_mult_mcp_mod 会并发调用）
+_MODULE_IMPORT_LOCK = threading.Lock()
+
+# 已解析的 JSON 文件缓存 {path: ((path, mtime_ns, size), data)}
+_JSON_CACHE: Dict[str, tuple] = {}
+
+
+def _load_json_cached(path: str):
+    """读取 JSON 文件，文件未变化（mtime/size 相同）时直接返回缓存结果
+
+    返回的对象在多个调用方之间共享，调用方不应修改它。
+    """
+    st = os.stat(path)
+    key = (path, st.st_mtime_ns, st.st_size)
+    hit = _JSON_CACHE.get(path)
+    if hit and hit[0] == key:
+        return hit[1]
+
+    data = read_json(path)
+    _JSON_CACHE[path] = (key, data)
+    return data
+
+
+# 命令行最多拆分的次数（工具名 + 参数），防止模型输出异常长的参数列表
+_MAX_COMMAND_SPLITS = 32
+
+# 保存 MCP 路径时把反斜杠统一为正斜杠
+_SLASH_TRANS = str.maketrans('\\', '/')
+
+# 流式回调合并阈值：累计字符数或距上次发送的时间（秒）达到其一即发送
+_CALLBACK_FLUSH_CHARS = 64
+_CALLBACK_FLUSH_INTERVAL = 0.05
+
+# 流式接收时每隔多少块检查一次停止标志（每轮请求开始和执行工具前仍会检查）
+_STOP_POLL_CHUNKS = 8
+
+# 空闲执行状态，只读且所有实例共享；get_execution_status 返回副本，外部无法修改
+_IDLE_STATUS = MappingProxyType({
+    "status": "idle",
+    "tool_name": None,
+    "tool_args": None,
+    "start_time": None
+})
+
+# 判断执行命令后的回复是否已是完整总结的常见词汇，合并为一个正则一次扫描完成
+_SUMMARY_KEYWORDS_RE = re.compile('|'.join(map(re.escape, (
+    '您的', '包含', '总结', '综上', '因此', '文件', '文件夹',
+    'your', 'contains', 'summary', 'conclusion', 'files', 'folders',
+))))
+
+# 共享的 httpx 连接池 {api_base: httpx.Client}，多个 AI 实例复用 TCP/TLS 连接
+_HTTP_CLIENTS: Dict[str, object] = {}
+_HTTP_CLIENTS_LOCK = threading.Lock()
+
+# httpx 的 HTTP/2 支持依赖可选的 h2 包；只检查是否已安装，不在导入时加载它
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def _get_http_client(api_base: str):
+    """获取（或首次使用时创建）指向 api_base 的共享同步 httpx 客户端（绕过系统代理）"""
+    client = _HTTP_CLIENTS.get(api_base)
+    if client is not None and not client.is_closed:
+        return client
+
+    with _HTTP_CLIENTS_LOCK:
+        client = _HTTP_CLIENTS.get(api_base)
+        if client is None or client.is_closed:
+            import httpx
+
+            # Create a mount that bypasses proxy for all URLs
+            # 使用 mounts 时连接池参数需要设置在 transport 上，Client 级别的 limits 不生效
+            no_proxy_mount = httpx.HTTPTransport(
+                verify=True,
+                http2=_HTTP2_AVAILABLE,
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=20, keepalive_expiry=60)
+            )
+            client = httpx.Client(
+                mounts={
+                    "http://": no_proxy_mount,
+                    "https://": no_proxy_mount,
+                },
+                timeout=60.0
+            )
+            _HTTP_CLIENTS[api_base] = client
+    return client
+
+
+def _dumps_pretty(obj) -> str:
+    """序列化工具调用结果（缩进 2，保留非 ASCII 字符）"""
+    return dumps_json(obj).decode('utf-8')
+
+
+@functools.lru_cache(maxsize=8)
+def _command_line_re(cmd_start: str) -> "re.Pattern":
+    """匹配以命令标记开头的行（允许行首空白），group(1) 为从标记开始的整行"""
+    return re.compile(r'^[^\S\n]*(' + re.escape(cmd_start) + r'[^\n]*)', re.MULTILINE)
+
+
+class _CommandScanner:
+    """流式接收时增量定位命令起始标记，判断第一条命令行是否已经完整
+
+    各流式处理路径共用；标记可能被拆在两块之间，因此保留上一块的末尾
+    """
+
+    __slots__ = ('cmd_start', 'tail_keep', 'tail', 'received', 'seen', 'offset')
+
+    def __init__(self, cmd_start: str):
+        self.cmd_start = cmd_start
+        self.tail_keep = len(cmd_start) - 1  # 跨块检测时需要保留的上一块末尾长度
+        self.tail = ""
+        self.received = 0  # 已接收的字符数（不含当前块）
+        self.seen = False  # 是否已出现命令标记
+        self.offset = -1  # 命令起始标记在完整回复中的位置
+
+    def feed(self, content: str) -> bool:
+        """处理一块内容，命令行已结束（标记之后出现换行）时返回 True"""
+        if not self.seen:
+            window = self.tail + content
+            idx = window.find(self.cmd_start)
+            if idx == -1:
+                self.tail = window[-self.tail_keep:] if self.tail_keep > 0 else ""
+                self.received += len(content)
+                return False
+            self.seen = True
+            self.offset = self.received - len(self.tail) + idx
+            pending = window[idx + len(self.cmd_start):]
+        else:
+            pending = content
+        return "\n" in pending
+
+
+class _CallbackBuffer:
+    """合并流式回调内容：累计字符数或距上次发送的时间达到阈值时才交给回调
+
+    界面按"本次回调是否包含命令标记"区分命令和普通内容，因此命令标记首次出现时
+    先单独发送标记之前的内容，标记总是在新的一次回调开头；标记出现之前按阈值发送时
+    保留末尾 len(cmd_start) - 1 个字符，避免标记被拆在两次回调之间。
+    只负责缓冲，由调用方决定同步或异步调用回调
+    """
+
+    __slots__ = ('parts', 'size', 'last_flush', 'sent', 'marker_split', 'hold')
+
+    def __init__(self, cmd_start: str = ""):
+        self.hold = max(len(cmd_start) - 1, 0)  # 标记出现之前每次发送时保留的末尾字符数
+        self.parts = []
+        self.size = 0
+        self.last_flush = time.monotonic()
+        self.sent = 0  # 已交给回调的字符数
+        self.marker_split = False  # 是否已在命令标记处拆分过
+
+    def add(self, content: str, marker_offset: int = -1) -> Optional[str]:
+        """加入一块内容，需要发送时返回合并后的文本，否则返回 None
+
+        marker_offset 为命令标记在完整回复中的位置（_CommandScanner.offset，未出现时为 -1）
+        """
+        self.parts.append(content)
+        self.size += len(content)
+        now = time.monotonic()
+        if marker_offset >= 0 and not self.marker_split:
+            # 只发送标记之前的内容，标记及之后的内容留待下一次回调
+            self.marker_split = True
+            self.last_flush = now
+            pending = "".join(self.parts)
+            cut = max(marker_offset - self.sent, 0)
+            self.parts = [pending[cut:]]
+            self.size = len(pending) - cut
+            self.sent += cut
+            return pending[:cut] or None
+        if self.size >= _CALLBACK_FLUSH_CHARS or now - self.last_flush >= _CALLBACK_FLUSH_INTERVAL:
+            self.last_flush = now
+            if self.marker_split or not self.hold:
+                return self.drain()
+            # 末尾可能是尚未接收完整的命令标记，留待下一次回调
+            pending = "".join(self.parts)
+            cut = len(pending) - self.hold
+            if cut <= 0:
+                return None
+            self.parts = [pending[cut:]]
+            self.size = self.hold
+            self.sent += cut
+            return pending[:cut]
+        return None
+
+    def drain(self) -> str:
+        """取出全部剩余内容（没有时返回空字符串）"""
+        text = "".join(self.parts)
+        self.parts.clear()
+        self.size = 0
+        self.sent += len(text)
+        return text
+
+
+def _truncate(text: str, limit: int = 100) -> str:
+    """截断过长文本用于日志输出"""
+    return f"{text[:limit]}..." if len(text) > limit else text
+
+
+def _render_tool_desc(doc: str) -> str:
+    """生成写入系统提示的工具描述：没有 CORRECT/WRONG 示例时补充位置参数说明"""
+    if "CORRECT:" not in doc and "WRONG:" not in doc:
+        # 如果描述中没有使用示例，添加一个通用的使用说明
+        return doc + "\n\nIMPORTANT: Call with positional arguments only, do NOT use parameter names."
+    return doc
+
+
+def _call_mcp_tool(manager, ser_name, tool_name, /, **kwargs) -> str:
+    """调用 MCP 工具并序列化结果（通过 functools.partial 绑定前三个参数）"""
+    return _dumps_pretty(manager.call_tool(ser_name, tool_name, kwargs))
+
+
+def _call_mcp_tool_safe(manager, ser_name, tool_name, /, **kwargs) -> str:
+    """同 _call_mcp_tool，但把调用异常包装为 {"error": ...} 结果返回"""
+    try:
+        return _dumps_pretty(manager.call_tool(ser_name, tool_name, kwargs))
+    except Exception as e:
+        return _dumps_pretty({"error": str(e)})
 
 
 def _load_default_prompts() -> Dict:
@@ -24,10 +254,9 @@ def _load_default_prompts() -> Dict:
     try:
         config_path = os.path.join(os.path.dirname(__file__), 'default_prompts.json')
         if os.path.exists(config_path):
-            with open(config_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return _load_json_cached(config_path)
     except Exception as e:
-        print(f"[AI] Failed to load default_prompts.json: {e}")
+        logger.warning("Failed to load default_prompts.json: %s", e)
 
     # Return minimal fallback if file doesn't exist
     return {
@@ -46,10 +275,9 @@ def _load_default_config() -> Dict:
     try:
         config_path = os.path.join(os.path.dirname(__file__), 'default_config.json')
         if os.path.exists(config_path):
-            with open(config_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return _load_json_cached(config_path)
     except Exception as e:
-        print(f"[AI] Failed to load default_config.json: {e}")
+        logger.warning("Failed to load default_config.json: %s", e)
 
     # Return minimal fallback if file doesn't exist
     return {
@@ -64,11 +292,371 @@ _DEFAULT_PROMPTS = _load_default_prompts()
 _DEFAULT_CONFIG = _load_default_config()
 
 
+def _detect_static_environment() -> Dict[str, str]:
+    """检测进程内不变的环境信息（操作系统、用户、关键路径）"""
+    env_info = {}
+
+    # 操作系统
+    env_info['os'] = platform.system()
+    env_info['os_release'] = platform.release()
+
+    # 用户名
+    env_info['username'] = os.path.expanduser('~').split(os.sep)[-1]
+
+    # 关键路径
+    home_dir = os.path.expanduser('~')
+    env_info['home_dir'] = home_dir
+
+    # 桌面路径
+    if env_info['os'] == 'Windows':
+        desktop_dir = os.path.join(os.path.expandvars('%USERPROFILE%'), 'Desktop')
+        if not os.path.exists(desktop_dir):
+            # 备选方案
+            desktop_dir = os.path.join(home_dir, 'Desktop')
+    else:
+        # Linux/Mac
+        desktop_dir = os.path.join(home_dir, 'Desktop')
+
+    env_info['desktop_dir'] = desktop_dir if os.path.exists(desktop_dir) else home_dir
+
+    return env_info
+
+
+# platform 查询在部分系统上开销较大，导入时检测一次
+_ENV_INFO = _detect_static_environment()
+
+
+def _detect_environment() -> Dict[str, str]:
+    """检测当前环境信息（返回副本，当前工作目录实时读取）"""
+    env_info = dict(_ENV_INFO)
+
+    # 当前工作目录
+    env_info['cwd'] = os.getcwd()
+
+    return env_info
+
+
+# MCP 相对路径中需要去掉的前缀（同时兼容 / 和 \ 分隔符）
+_CUR_DIR_PREFIXES = ("./", ".\\")
+_TOOLS_DIR_PREFIXES = ("tools/", "tools\\")
+
+
+# 会话配置管理器（首次使用时才导入 utils.conversation_config）
+_config_manager = None
+
+
+def _get_config_manager():
+    """获取会话配置管理器，导入与创建只发生一次"""
+    global _config_manager
+    if _config_manager is None:
+        from utils.conversation_config import get_global_config_manager
+        _config_manager = get_global_config_manager()
+    return _config_manager
+
+
+# 会话名称中允许的字符之外的部分（\w 覆盖 Unicode 字母数字，保留中文名称）
+_SAFE_NAME_RE = re.compile(r'[^\w .\-]+')
+
+
+# 键是用户输入的会话名称，限制缓存大小，避免长时间运行时无限增长
+@functools.lru_cache(maxsize=256)
+def _sanitize_name(name: str) -> str:
+    """清理会话名称，用作文件夹名"""
+    # 移除非法字符，并替换空格为下划线
+    safe_name = _SAFE_NAME_RE.sub('', name).strip().replace(' ', '_')
+    return safe_name or "default_chat"
+
+
+@functools.lru_cache(maxsize=8)
+def _build_base_prompt(command_start: str, command_separator: str) -> str:
+    """生成基础系统提示（只依赖命令格式，按参数缓存）"""
+    return f"""
+You are an AI assistant that can directly execute commands and call available tools.
+
+[CRITICAL: Always Read Tool Descriptions]
+Before calling ANY tool, you MUST:
+1. Read the tool's COMPLETE description
+2. Check if the description mentions required prerequisites (e.g., "Must call X first")
+3. Follow any documented workflows EXACTLY
+4. Look for keywords: 'CRITICAL', 'MUST', 'REQUIREMENT', 'PREREQUISITE'
+
+[Example: Path-Related Questions]
+When user asks about "my desktop", "my home directory", "my files":
+- Read the file operation tool's description
+- If it says "Call get_system_info first" - DO IT
+- If it says "Use actual paths from system info" - DO IT
+- NEVER guess or assume paths
+- Follow the workflow documented in the tool description
+
+[Key Principle]
+Tool descriptions tell you HOW to use them correctly. Different MCP servers may use different names and workflows. Always read the description.
+
+【Core Principles】
+1. **Strict Response Mode**:
+- When the user explicitly requests an operation (query, search, file operations, etc.), **only output one line {command_start} instruction**, without any other text
+- When the user requests content creation, answers questions, or normal conversation, **directly output the content itself**, without any additional explanations
+- When the user says "continue", only output the next {command_start} instruction, without any explanation
+
+2. **Accurate Understanding of Intent**:
+- User states facts (e.g., "I'm from Jinan") → Respond directly to the fact, do not call tools
+- User explicitly requests operations (e.g., "save file to desktop") → Call the corresponding tool
+
+3. **Use Correct Tools and Syntax**:
+- Only use actually available tools
+- Ensure command syntax is correct, especially for file operations
+
+【Output Format Requirements】
+- **IMPORTANT**: Always format your responses using **Markdown** for better readability
+- Use proper headings (##, ###), bullet points, code blocks, and bold text where appropriate
+- For code examples, use triple backticks (```) to create code blocks
+- For structured information, use tables or lists
+- Keep responses well-organized and easy to scan
+
+Before executing MCP tools, please check:
+1. Are all required parameters provided in the correct format?
+2. Are parameter value types correct (numbers/strings/booleans)?
+3. Are there additional optional parameters that can be provided?
+4. If there's an error, try multiple parameter formats, such as 2, peoplecount=2, etc.
+
+If unsure, ask the user what parameters are needed.
+
+【Call Format】
+- `{command_start} tool_name {command_separator} param1 {command_separator} param2 {command_separator} ...`
+- Or direct system command: `{command_start} command {command_separator} param1 {command_separator} param2 {command_separator} ...`
+
+【Strictly Prohibited】
+1. Do not add explanatory text before or after any {command_start} instruction
+2. Do not actively plan multi-step operations when not explicitly requested by user
+3. Do not use incorrect command syntax (especially for file operations)
+4. Do not output words like "I'll", "let me", "try", "now", "then", etc.
+5. Do not provide alternative suggestions or explain reasons when operations fail
+6. Do not combine multiple operations into one instruction without explicit user request
+
+【Error Examples】
+User: I'm from Jinan
+Wrong: {command_start} weather {command_separator} Jinan # (User is just stating, not requesting query)
+
+User: continue
+Wrong: [AI] Now getting current date... # (Should only output {command_start} instruction, no explanation)
+
+User: save file
+Wrong: {command_start} echo {command_separator} content {command_separator} 2 {command_separator} file_path # (Incorrect redirection syntax)
+
+【Multi-step Operation Rules】
+1. Only execute multiple steps when user explicitly requests multiple operations
+2. Execute only one step at a time, wait for user to say "continue" before next step
+3. Output only one {command_start} instruction per step, without any other text
+4. Do not decompose tasks on your own if user doesn't explicitly request multiple steps
+
+【Error Handling】
+- If execution fails, directly reply "Operation failed" (non-{command_start} situation) or wait for further user instructions
+- Do not explain reasons, do not provide alternatives
+
+Please strictly follow these rules to ensure responses are concise, accurate, and meet actual user needs.
+""".strip()
+
+
+# 框架级工具描述阅读要求（有工具启用时加入系统提示），内容固定，模块加载时创建一次
+_TOOL_DESC_READING_PROMPT = """【CRITICAL: Tool Description Reading Requirements - MANDATORY】
+
+**MUST READ COMPLETE DESCRIPTIONS:**
+You MUST carefully read the ENTIRE description for EACH tool before using it.
+
+**PAY SPECIAL ATTENTION TO:**
+Sections marked with:
+- 'CRITICAL' or '**CRITICAL**'
+- 'MUST' or '**MUST**'
+- 'REQUIREMENT' or '**REQUIREMENT**'
+- 'WORKFLOW' or '**WORKFLOW**'
+- 'PREREQUISITE' or '**PREREQUISITE**'
+
+**WHY THIS MATTERS:**
+These highlighted sections contain CRITICAL information about:
+- Required setup steps BEFORE using the tool
+- Dependencies on OTHER tools that must be called FIRST
+- Correct usage patterns and parameter order
+- Common mistakes to AVOID
+- Multi-step workflows that MUST be followed
+
+**EXAMPLES OF CRITICAL WORKFLOWS:**
+- Some file operations REQUIRE calling system information tools FIRST
+- Some operations have specific prerequisite steps
+- Some tools depend on results from other tools
+- Tool descriptions will tell you the exact workflow to follow
+
+**MANDATORY PRACTICE:**
+1. BEFORE calling any tool: Read its COMPLETE description
+2. Look for 'CRITICAL', 'MUST', 'REQUIREMENT' markers
+3. Follow documented workflows EXACTLY
+4. NEVER skip steps marked as 'REQUIRED' or 'MUST'
+5. If a description says "Call X first", ALWAYS call X first
+
+**CONSEQUENCES OF NOT READING:**
+Skipping these sections will cause operations to FAIL because you won't have:
+- Required information from prerequisite tools
+- Correct parameter values
+- Proper setup completed
+
+FAILURE TO FOLLOW TOOL DESCRIPTION WORKFLOWS WILL RESULT IN ERRORS."""
+
+# Markdown 格式规范（始终加入系统提示），内容固定，模块加载时创建一次
+_MARKDOWN_FORMAT_PROMPT = """【CRITICAL: Markdown Formatting Requirements - MANDATORY】
+
+**MANDATORY LINE BREAK RULES:**
+You MUST use blank lines between different Markdown elements (lists, sections, code blocks).
+- NEVER cram multiple items into one paragraph
+- ALWAYS add a blank line BEFORE each list (bullet or numbered)
+- ALWAYS add a blank line BETWEEN different sections
+- ALWAYS add a blank line BEFORE and AFTER code blocks
+
+**Correct Format:**
+```
+Here are the items:
+
+- Item 1
+- Item 2
+- Item 3
+```
+
+**Wrong Format:**
+```
+Here are the items: - Item 1 - Item 2 - Item 3
+```
+
+**MANDATORY STRUCTURE:**
+1. Start with a brief summary (2-3 sentences max)
+
+2. Use ## for main sections (with blank line before)
+
+3. Use - or * for bullet points (with blank line before list)
+
+4. Use numbered lists (1. 2. 3.) for steps (with blank line before list)
+
+5. Use ```language for code blocks (with blank lines before/after)
+
+6. End with a brief conclusion
+
+**LANGUAGE RULE:**
+Respond in the SAME language as the user's message (Chinese→Chinese, English→English).
+
+**Line Break Examples:**
+
+GOOD:
+```
+Found 5 files:
+
+1. file1.txt
+2. file2.txt
+3. file3.txt
+```
+
+BAD:
+```
+Found 5 files: 1. file1.txt 2. file2.txt 3. file3.txt
+```
+
+GOOD:
+```
+Categories:
+
+- Programming
+- Tools
+- Documents
+```
+
+BAD:
+```
+Categories: - Programming - Tools - Documents
+```
+
+**Code Format:**
+Always use triple backticks with language (blank lines before/after):
+
+```python
+print('hello')
+```
+
+VIOLATION OF THESE FORMATTING RULES WILL RESULT IN POOR USER EXPERIENCE.
+STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
+
+
+# 流式请求出错时返回给用户的提示：固定头部 + 按错误信息关键字匹配的原因与建议
+_STREAM_ERROR_HEADER = (
+    "❌ **Connection Error**\n\n"
+    "**Error Details:**\n"
+    "- Type: {type}\n"
+    "- Message: {msg}\n\n"
+)
+# 错误类别按优先级排列：每个分组对应下面 _STREAM_ERROR_HINTS 中同位置的模板
+_STREAM_ERROR_RE = re.compile(r'(connection|network)|(timeout)|(authentication|401)|(rate|429)', re.IGNORECASE)
+_STREAM_ERROR_HINTS = (
+    "**Possible Causes:**\n"
+    "- Network connection issue\n"
+    "- API server is down or unreachable\n"
+    "- Firewall or proxy blocking the connection\n"
+    "- Incorrect API base URL\n\n"
+    "**Suggestions:**\n"
+    "- Check your internet connection\n"
+    "- Verify API base URL: `{api_base}`\n"
+    "- Try again later\n",
+
+    "**Request timed out.**\n\n"
+    "**Suggestions:**\n"
+    "- Check your network speed\n"
+    "- The API server might be overloaded\n"
+    "- Try again later\n",
+
+    "**Authentication failed.**\n\n"
+    "**Suggestions:**\n"
+    "- Check your API key\n"
+    "- Verify your API key is valid\n",
+
+    "**Rate limit exceeded.**\n\n"
+    "**Suggestions:**\n"
+    "- Wait a moment and try again\n"
+    "- Check your API usage limits\n",
+)
+
+
+def _format_stream_error(e: Exception, api_base: str) -> str:
+    """生成流式请求出错时的用户提示
+
+    一次正则扫描找出所有命中的类别，取优先级最高（分组序号最小）的一个
+    """
+    category = min((m.lastindex for m in _STREAM_ERROR_RE.finditer(str(e))), default=None)
+    hint = _STREAM_ERROR_HINTS[category - 1].format(api_base=api_base) if category else ""
+    return _STREAM_ERROR_HEADER.format(type=type(e).__name__, msg=e) + hint
+
+
 class AI:
     """
     完整的AI助手类，支持流式、命令执行和完整历史管理
     """
-    
+
+    # 多个对话窗口各持有一个实例，使用 __slots__ 省去每个实例的 __dict__
+    # 新增实例属性时需要同步加入这里
+    __slots__ = (
+        # MCP 工具
+        'mcp_paths', 'funcs', 'mcp_managers', 'mcp_tools_desc', 'mcp_tools_desc_rendered',
+        'enabled_mcp_tools',
+        # 对话与 API
+        'chat_name', 'conversation_config', '_api_key_param', 'api_base', 'model',
+        'client', 'aclient', '_aclient_loop', '_aclient_close_tasks',
+        # 命令与提示词
+        'command_start', 'command_separator', 'max_iterations',
+        'command_execution_prompt', 'command_retry_prompt', 'final_summary_prompt',
+        'user_system_prompt', 'system_prompt',
+        # 生成参数
+        'temperature', 'max_tokens', 'top_p', 'stop', 'stream',
+        'presence_penalty', 'frequency_penalty',
+        # 运行状态
+        'conv_his', 'execution_status', 'env_info', '_stop_flag',
+        # 缓存
+        '_tools_desc_cache', '_tools_desc_dirty', '_prompt_cache_key', '_prompt_cache_val',
+        '_tools_listing_sig', '_tools_listing', 'func_signatures',
+        '_api_params_key', '_api_params_val', '_tools_list_cache', '_last_system_prompt',
+    )
+
     def __init__(self,
                 # 基本配置
                 mcp_paths=None,
@@ -110,8 +698,34 @@ class AI:
 
         # MCP 工具描述字典 - 独立于 system_prompt
         self.mcp_tools_desc = {}  # {tool_name: description}
+        self.mcp_tools_desc_rendered = {}  # {tool_name: 用于系统提示的描述（已补充位置参数提示）}
         self.enabled_mcp_tools = set()  # 已启用的 MCP 工具集合
 
+        # 工具描述缓存 - 工具集或命令格式变化时失效
+        self._tools_desc_cache: Optional[str] = None
+        self._tools_desc_dirty = True
+
+        # 有效系统提示缓存 - 键为 (用户提示, 已启用工具集合)
+        self._prompt_cache_key = None
+        self._prompt_cache_val: Optional[str] = None
+
+        # 上一次写入历史开头的有效系统提示 - 只有它过期时才会被替换
+        self._last_system_prompt: Optional[str] = None
+
+        # 可用工具列表缓存 - 见 get_available_tools，工具集变化时清空
+        self._tools_list_cache: Optional[List[Dict]] = None
+
+        # tools 目录文件名缓存 - 见 _list_tools_dir，目录 mtime 变化时重新读取
+        self._tools_listing_sig = None
+        self._tools_listing: set = set()
+
+        # 请求基础参数缓存 - 见 _base_api_params
+        self._api_params_key = None
+        self._api_params_val: Dict = {}
+
+        # 工具参数名缓存 {func_name: [param, ...]} - 供参数错误提示使用，工具集变化时清空
+        self.func_signatures: Dict[str, List[str]] = {}
+
         # 会话配置管理
         self.chat_name = chat_name or "default"
         self.conversation_config = None
@@ -119,9 +733,7 @@ class AI:
         # 如果提供了会话名称,从配置文件加载 API key
         if chat_name:
             try:
-                from utils.conversation_config import get_global_config_manager
-                config_manager = get_global_config_manager()
-                self.conversation_config = config_manager.get_config(chat_name)
+                self.conversation_config = _get_config_manager().get_config(chat_name)
 
                 # 从配置文件加载其他配置
                 if not api_base:
@@ -129,13 +741,16 @@ class AI:
                 if not model:
                     model = self.conversation_config.get_model()
             except Exception as e:
-                print(f"[AI] Failed to load conversation config: {e}")
+                logger.warning("Failed to load conversation config: %s", e)
 
         # API配置 - api_key 不存储，每次从文件读取
         self._api_key_param = api_key  # 仅用于判断是否提供了参数
         self.api_base = api_base or _DEFAULT_CONFIG.get('api', {}).get('api_base', 'https://api.deepseek.com')
         self.model = model or _DEFAULT_CONFIG.get('api', {}).get('model', 'deepseek-chat')
         self.client = None
+        self.aclient = None  # 异步客户端，首次调用 achat / 异步流式处理时创建
+        self._aclient_loop = None  # 创建 aclient 的事件循环，连接池只能在这个循环上关闭
+        self._aclient_close_tasks = set()  # 尚未完成的关闭任务，保留引用以免被垃圾回收
 
         # 命令配置
         self.command_start = command_start
@@ -162,15 +777,10 @@ class AI:
         self.conv_his = []
 
         # 执行状态跟踪
-        self.execution_status = {
-            "status": "idle",
-            "tool_name": None,
-            "tool_args": None,
-            "start_time": None
-        }
+        self._set_execution_status("idle")
 
         # 环境信息检测
-        self.env_info = self._detect_environment()
+        self.env_info = _detect_environment()
 
         # 停止标志
         self._stop_flag = False
@@ -190,167 +800,46 @@ class AI:
         # system_prompt 将在需要时动态组合（用户提示 + 工具描述 + Markdown 规范）
         self.system_prompt = self.user_system_prompt
 
-        # 重置对话历史（添加系统提示）
-        self.reset_conversation()
-
-        print(f"[AI] 初始化完成，加载了 {len(self.funcs)} 个工具，stream={self.stream}")
-
-    @property
-    def api_key(self) -> str:
-        """获取 API key（每次从 .confignore 文件读取）"""
-        # 1. 如果 conversation_config 存在，优先从文件读取
-        if self.conversation_config:
-            key = self.conversation_config.get_api_key()
-            if key:
-                return key
-
-        # 2. 尝试从参数获取（初始化时提供的）
-        if self._api_key_param:
-            return self._api_key_param
-
-        # 3. 回退到环境变量
-        return os.environ.get("DEEPSEEK_API_KEY") or \
-               os.environ.get("OPENAI_API_KEY") or \
-               os.environ.get("ANTHROPIC_API_KEY") or ""
-
-    def _sanitize_name(self, name: str) -> str:
-        """清理会话名称，用作文件夹名"""
-        import re
-        # 移除非法字符
-        safe_name = "".join(c for c in name if c.isalnum() or c in (' ', '-', '_', '.')).strip()
-        # 替换空格为下划线
-        safe_name = safe_name.replace(' ', '_')
-        return safe_name or "default_chat"
-
-    def _detect_environment(self) -> Dict[str, str]:
-        """检测当前环境信息"""
-        import platform
-        env_info = {}
-
-        # 操作系统
-        env_info['os'] = platform.system()
-        env_info['os_release'] = platform.release()
-
-        # 用户名
-        env_info['username'] = os.path.expanduser('~').split(os.sep)[-1]
-
-        # 关键路径
-        home_dir = os.path.expanduser('~')
-        env_info['home_dir'] = home_dir
-
-        # 桌面路径
-        if env_info['os'] == 'Windows':
-            desktop_dir = os.path.join(os.path.expandvars('%USERPROFILE%'), 'Desktop')
-            if not os.path.exists(desktop_dir):
-                # 备选方案
-                desktop_dir = os.path.join(home_dir, 'Desktop')
-        else:
-            # Linux/Mac
-            desktop_dir = os.path.join(home_dir, 'Desktop')
-
-        env_info['desktop_dir'] = desktop_dir if os.path.exists(desktop_dir) else home_dir
-
-        # 当前工作目录
-        env_info['cwd'] = os.getcwd()
-
-        return env_info
-
-    def get_complete_system_prompt(self):
-        """返回完整的系统提示"""
-        # 生成工具描述
-        tools_desc = self.gen_tools_desc()
-
-        # 基础系统提示
-        base_prompt = f"""
-You are an AI assistant that can directly execute commands and call available tools.
-
-[CRITICAL: Always Read Tool Descriptions]
-Before calling ANY tool, you MUST:
-1. Read the tool's COMPLETE description
-2. Check if the description mentions required prerequisites (e.g., "Must call X first")
-3. Follow any documented workflows EXACTLY
-4. Look for keywords: 'CRITICAL', 'MUST', 'REQUIREMENT', 'PREREQUISITE'
-
-[Example: Path-Related Questions]
-When user asks about "my desktop", "my home directory", "my files":
-- Read the file operation tool's description
-- If it says "Call get_system_info first" - DO IT
-- If it says "Use actual paths from system info" - DO IT
-- NEVER guess or assume paths
-- Follow the workflow documented in the tool description
-
-[Key Principle]
-Tool descriptions tell you HOW to use them correctly. Different MCP servers may use different names and workflows. Always read the description.
-
-【Core Principles】
-1. **Strict Response Mode**:
-- When the user explicitly requests an operation (query, search, file operations, etc.), **only output one line {self.command_start} instruction**, without any other text
-- When the user requests content creation, answers questions, or normal conversation, **directly output the content itself**, without any additional explanations
-- When the user says "continue", only output the next {self.command_start} instruction, without any explanation
-
-2. **Accurate Understanding of Intent**:
-- User states facts (e.g., "I'm from Jinan") → Respond directly to the fact, do not call tools
-- User explicitly requests operations (e.g., "save file to desktop") → Call the corresponding tool
-
-3. **Use Correct Tools and Syntax**:
-- Only use actually available tools
-- Ensure command syntax is correct, especially for file operations
-
-【Output Format Requirements】
-- **IMPORTANT**: Always format your responses using **Markdown** for better readability
-- Use proper headings (##, ###), bullet points, code blocks, and bold text where appropriate
-- For code examples, use triple backticks (```) to create code blocks
-- For structured information, use tables or lists
-- Keep responses well-organized and easy to scan
-
-Before executing MCP tools, please check:
-1. Are all required parameters provided in the correct format?
-2. Are parameter value types correct (numbers/strings/booleans)?
-3. Are there additional optional parameters that can be provided?
-4. If there's an error, try multiple parameter formats, such as 2, peoplecount=2, etc.
-
-If unsure, ask the user what parameters are needed.
-
-【Call Format】
-- `{self.command_start} tool_name {self.command_separator} param1 {self.command_separator} param2 {self.command_separator} ...`
-- Or direct system command: `{self.command_start} command {self.command_separator} param1 {self.command_separator} param2 {self.command_separator} ...`
-
-【Strictly Prohibited】
-1. Do not add explanatory text before or after any {self.command_start} instruction
-2. Do not actively plan multi-step operations when not explicitly requested by user
-3. Do not use incorrect command syntax (especially for file operations)
-4. Do not output words like "I'll", "let me", "try", "now", "then", etc.
-5. Do not provide alternative suggestions or explain reasons when operations fail
-6. Do not combine multiple operations into one instruction without explicit user request
-
-【Error Examples】
-User: I'm from Jinan
-Wrong: {self.command_start} weather {self.command_separator} Jinan # (User is just stating, not requesting query)
+        # 重置对话历史（添加系统提示）
+        self.reset_conversation()
 
-User: continue
-Wrong: [AI] Now getting current date... # (Should only output {self.command_start} instruction, no explanation)
+        logger.info("初始化完成，加载了 %s 个工具，stream=%s", len(self.funcs), self.stream)
 
-User: save file
-Wrong: {self.command_start} echo {self.command_separator} content {self.command_separator} 2 {self.command_separator} file_path # (Incorrect redirection syntax)
+    @property
+    def api_key(self) -> str:
+        """获取 API key（每次从 .confignore 文件读取）"""
+        # 1. 如果 conversation_config 存在，优先从文件读取
+        if self.conversation_config:
+            key = self.conversation_config.get_api_key()
+            if key:
+                return key
 
-【Multi-step Operation Rules】
-1. Only execute multiple steps when user explicitly requests multiple operations
-2. Execute only one step at a time, wait for user to say "continue" before next step
-3. Output only one {self.command_start} instruction per step, without any other text
-4. Do not decompose tasks on your own if user doesn't explicitly request multiple steps
+        # 2. 尝试从参数获取（初始化时提供的）
+        if self._api_key_param:
+            return self._api_key_param
 
-【Error Handling】
-- If execution fails, directly reply "Operation failed" (non-{self.command_start} situation) or wait for further user instructions
-- Do not explain reasons, do not provide alternatives
+        # 3. 回退到环境变量
+        return os.environ.get("DEEPSEEK_API_KEY") or \
+               os.environ.get("OPENAI_API_KEY") or \
+               os.environ.get("ANTHROPIC_API_KEY") or ""
 
-Please strictly follow these rules to ensure responses are concise, accurate, and meet actual user needs.
-"""
+    def _sanitize_name(self, name: str) -> str:
+        """清理会话名称，用作文件夹名"""
+        return _sanitize_name(name)
+
+    def get_complete_system_prompt(self):
+        """返回完整的系统提示"""
+        # 生成工具描述
+        tools_desc = self.gen_tools_desc()
+
+        # 基础系统提示（按命令格式缓存）
+        base_prompt = _build_base_prompt(self.command_start, self.command_separator)
 
         # 组合完整的系统提示：工具描述 + 基础提示
-        full_prompt = base_prompt.strip()
+        full_prompt = base_prompt
 
         if tools_desc:
-            full_prompt = tools_desc + "\n\n" + base_prompt.strip()
+            full_prompt = tools_desc + "\n\n" + base_prompt
 
         return full_prompt
     
@@ -373,14 +862,10 @@ Please strictly follow these rules to ensure responses are concise, accurate, an
                         tool_name = tool.get('name', '')
                         if tool_name:
                             func_name = f"mcp_{ser_name}_{tool_name}"
-                            def make_tool_func(name_ser, name_tool, desc):
-                                def tool_func(**kwargs):
-                                    res = mcp_manager.call_tool(name_ser, name_tool, kwargs)
-                                    return json.dumps(res, ensure_ascii=False, indent=2)
-                                tool_func.__name__ = name_tool
-                                tool_func.__doc__ = tool.get('description', desc)
-                                return tool_func
-                            funcs[func_name] = make_tool_func(ser_name, tool_name, tool.get('description', 'No description'))
+                            tool_func = functools.partial(_call_mcp_tool, mcp_manager, ser_name, tool_name)
+                            tool_func.__name__ = tool_name
+                            tool_func.__doc__ = tool.get('description', 'No description')
+                            funcs[func_name] = tool_func
                 
                 class MCPModule:
                     def __init__(self):
@@ -395,29 +880,35 @@ Please strictly follow these rules to ensure responses are concise, accurate, an
                     raise ImportError(f"Cannot load module from {mcp_path}")
                 
                 mcp_module = importlib.util.module_from_spec(spec)
-                sys.modules[module_name] = mcp_module
-                spec.loader.exec_module(mcp_module)
+                # 并发加载时串行化 sys.modules 注册和模块执行
+                with _MODULE_IMPORT_LOCK:
+                    sys.modules[module_name] = mcp_module
+                    spec.loader.exec_module(mcp_module)
                 
-                funcs = {}
-                for attr_name in dir(mcp_module):
-                    attr = getattr(mcp_module, attr_name)
-                    if callable(attr) and not attr_name.startswith('_'):
-                        funcs[attr_name] = attr
-                        
+                # 优先使用模块声明的 __all__，否则直接遍历模块字典（避免 dir() 排序和 getattr 开销）
+                exported = getattr(mcp_module, '__all__', None)
+                if exported is not None:
+                    items = ((name, getattr(mcp_module, name)) for name in exported)
+                else:
+                    items = vars(mcp_module).items()
+
+                funcs = {name: attr for name, attr in items
+                         if callable(attr) and not name.startswith('_')}
+
                 return mcp_module, funcs
             
         except Exception as e:
-            print(f"[Warning] Load failed: {e}")
+            logger.warning("Load failed: %s", e)
             return None, {}
     
     def load_mcp_tools(self):
         """从路径加载MCP工具"""
         if not self.mcp_paths:
-            print("[Info] No MCP paths to load")
+            logger.info("No MCP paths to load")
             self.enabled_mcp_tools = set()
             return
 
-        print(f"[Info] Loading {len(self.mcp_paths)} MCP tools during initialization...")
+        logger.info("Loading %s MCP tools during initialization...", len(self.mcp_paths))
 
         # 直接加载工具
         self._load_mcp_from_paths()
@@ -426,13 +917,13 @@ Please strictly follow these rules to ensure responses are concise, accurate, an
         # 用户可以通过设置对话框禁用不需要的工具
         if not self.enabled_mcp_tools and self.mcp_tools_desc:
             self.enabled_mcp_tools = set(self.mcp_tools_desc.keys())
-            print(f"[Info] Auto-enabled all {len(self.enabled_mcp_tools)} loaded tools")
+            logger.info("Auto-enabled all %s loaded tools", len(self.enabled_mcp_tools))
         elif self.enabled_mcp_tools:
-            # 只保留仍然存在的工具
-            self.enabled_mcp_tools = self.enabled_mcp_tools.intersection(set(self.mcp_tools_desc.keys()))
-            print(f"[Info] Kept {len(self.enabled_mcp_tools)} previously enabled tools")
+            # 只保留仍然存在的工具（keys() 视图可直接参与集合运算）
+            self.enabled_mcp_tools &= self.mcp_tools_desc.keys()
+            logger.info("Kept %s previously enabled tools", len(self.enabled_mcp_tools))
 
-        print(f"[Info] Loaded {len(self.funcs)} tools, {len(self.enabled_mcp_tools)} tools enabled")
+        logger.info("Loaded %s tools, %s tools enabled", len(self.funcs), len(self.enabled_mcp_tools))
 
     def reload_mcp_tools(self, mcp_paths=None):
         """按需重新加载 MCP 工具（从 settings 或会话配置）"""
@@ -440,30 +931,76 @@ Please strictly follow these rules to ensure responses are concise, accurate, an
             mcp_paths = self.mcp_paths
 
         if not mcp_paths:
-            print("[Info] No MCP paths to load")
+            logger.info("No MCP paths to load")
             return
 
-        print(f"[Info] Loading {len(mcp_paths)} MCP tools on demand...")
+        logger.info("Loading %s MCP tools on demand...", len(mcp_paths))
 
         # 使用加载逻辑
         self._load_mcp_from_paths()
 
         # 保留现有的 enabled_mcp_tools 设置，或者启用所有新工具
         if self.enabled_mcp_tools:
-            # 只保留仍然存在的工具
-            self.enabled_mcp_tools = self.enabled_mcp_tools.intersection(set(self.mcp_tools_desc.keys()))
+            # 只保留仍然存在的工具（keys() 视图可直接参与集合运算）
+            self.enabled_mcp_tools &= self.mcp_tools_desc.keys()
         elif self.mcp_tools_desc:
             # 如果没有启用任何工具，默认启用所有
             self.enabled_mcp_tools = set(self.mcp_tools_desc.keys())
-        print(f"[Info] Reloaded {len(self.funcs)} tools, {len(self.enabled_mcp_tools)} tools enabled")
+        logger.info("Reloaded %s tools, %s tools enabled", len(self.funcs), len(self.enabled_mcp_tools))
 
     def _load_mcp_from_paths(self):
         """从指定路径加载 MCP 工具"""
         # 不再自动添加默认工具
         # 用户必须明确添加工具
 
-        # 验证路径并转换为绝对路径
+        # 每次都重新验证路径：绝对路径和子目录路径逐个检查，只有 tools 目录的文件列表被缓存
+        valid_paths = self._resolve_mcp_paths()
+
+        if not valid_paths:
+            logger.warning("No valid MCP file paths found")
+            return
+
+        logger.info("Will load %s MCP files", len(valid_paths))
+
+        # 加载有效的MCP文件
+        _, self.funcs = self.load_mult_mcp_mod(valid_paths)
+        self._invalidate_tool_caches()
+
+        # 存储工具描述到字典(不直接加入 system_prompt)
+        if self.funcs:
+            for func_name, func in self.funcs.items():
+                self._set_tool_desc(func_name, func.__doc__ or "No description")
+                # Tool loaded successfully (silent)
+            self._invalidate_tool_caches()
+            logger.info("Loaded %s tools from %s files", len(self.mcp_tools_desc), len(valid_paths))
+
+    def _list_tools_dir(self, tools_dir: str) -> set:
+        """返回 tools 目录下的文件名集合
+
+        目录中直接增删文件会更新目录的 mtime，因此按 (绝对路径, mtime) 缓存 scandir 结果；
+        子目录中的文件不在集合内，由调用方逐个检查
+        """
+        try:
+            sig = (os.path.abspath(tools_dir), os.stat(tools_dir).st_mtime_ns)
+        except OSError:
+            return set()
+        if sig != self._tools_listing_sig:
+            with os.scandir(tools_dir) as it:
+                self._tools_listing = {entry.name for entry in it}
+            self._tools_listing_sig = sig
+        return self._tools_listing
+
+    def _resolve_mcp_paths(self) -> List[str]:
+        """验证 MCP 路径并转换为绝对路径"""
         valid_paths = []
+
+        # tools 目录的文件名用集合查找代替逐个 stat
+        tools_dir = None
+        existing = set()
+        if self.chat_name:
+            tools_dir = os.path.join("data", self._sanitize_name(self.chat_name), "tools")
+            existing = self._list_tools_dir(tools_dir)
+
         for path in self.mcp_paths:
             # 如果是绝对路径且存在，直接使用
             if os.path.isabs(path) and os.path.exists(path):
@@ -472,55 +1009,32 @@ Please strictly follow these rules to ensure responses are concise, accurate, an
 
             # 如果是相对路径，只从 data/chat_name/tools/ 查找
             if not os.path.isabs(path):
-                # 处理相对路径（移除 ./ 前缀）
-                if path.startswith("./"):
-                    relative_filename = path[2:]  # 移除 ./
-                elif path.startswith(".\\"):
-                    relative_filename = path[3:]  # 移除 .\
-                else:
-                    relative_filename = path
+                # 处理相对路径（移除 ./ 或 .\ 前缀）
+                relative_filename = path[2:] if path.startswith(_CUR_DIR_PREFIXES) else path
 
                 # 如果路径以 tools/ 开头，移除它（因为我们已经在 tools_dir 中）
-                if relative_filename.startswith("tools/"):
-                    relative_filename = relative_filename[6:]  # 移除 "tools/"
-                elif relative_filename.startswith("tools\\"):
-                    relative_filename = relative_filename[6:]  # 移除 "tools\"
+                if relative_filename.startswith(_TOOLS_DIR_PREFIXES):
+                    relative_filename = relative_filename[6:]
 
                 # 只从 data/chat_name/tools/ 目录查找
-                if self.chat_name:
-                    chat_dir = os.path.join("data", self._sanitize_name(self.chat_name))
-                    tools_dir = os.path.join(chat_dir, "tools")
+                if tools_dir is not None:
                     chat_path = os.path.join(tools_dir, relative_filename)
 
-                    if os.path.exists(chat_path):
+                    # 子目录路径或大小写不敏感的文件系统上集合未命中时，再回退到 exists
+                    if relative_filename in existing or os.path.exists(chat_path):
                         abs_path = os.path.abspath(chat_path)
                         valid_paths.append(abs_path)
                     else:
-                        print(f"[Warning] MCP tool not found: {path}")
+                        logger.warning("MCP tool not found: %s", path)
                 else:
-                    print(f"[Warning] No chat_name set, cannot resolve relative path: {path}")
+                    logger.warning("No chat_name set, cannot resolve relative path: %s", path)
             elif os.path.exists(path):
                 valid_paths.append(path)
-                print(f"[Debug]   Path exists, using: {path}")
+                logger.debug("Path exists, using: %s", path)
             else:
-                print(f"[Warning] File does not exist: {path}")
-
-        if not valid_paths:
-            print("[Warning] No valid MCP file paths found")
-            return
+                logger.warning("File does not exist: %s", path)
 
-        print(f"[Info] Will load {len(valid_paths)} MCP files")
-
-        # 加载有效的MCP文件
-        _, self.funcs = self.load_mult_mcp_mod(valid_paths)
-
-        # 存储工具描述到字典(不直接加入 system_prompt)
-        if self.funcs:
-            for func_name, func in self.funcs.items():
-                doc = func.__doc__ or "No description"
-                self.mcp_tools_desc[func_name] = doc
-                # Tool loaded successfully (silent)
-            print(f"[Info] Loaded {len(self.mcp_tools_desc)} tools from {len(valid_paths)} files")
+        return valid_paths
 
     def _load_mcp_from_config(self, config_path: str = None):
         """从 MCP 配置文件加载工具 - 为每个 server 创建独立的 MCPServerManager 实例
@@ -528,162 +1042,184 @@ Please strictly follow these rules to ensure responses are concise, accurate, an
         Args:
             config_path: 配置文件路径,默认为 ./tools/mcp_config.json
         """
-        import json
-
         config_path = config_path or os.path.join(os.path.dirname(os.path.abspath(__file__)), "tools", "mcp_config.json")
 
         if not os.path.exists(config_path):
-            print(f"[Warning] MCP config file not found at: {config_path}")
+            logger.warning("MCP config file not found at: %s", config_path)
             return
 
         try:
-            # 读取配置文件
-            with open(config_path, 'r', encoding='utf-8') as f:
-                config_data = json.load(f)
+            # 读取配置文件（未修改时复用已解析结果）
+            config_data = _load_json_cached(config_path)
 
             servers_config = config_data.get("servers", {})
 
             if not servers_config:
-                print("[Warning] No servers defined in MCP config")
+                logger.warning("No servers defined in MCP config")
                 return
 
-            print(f"[Info] Found {len(servers_config)} MCP servers in config")
+            logger.info("Found %s MCP servers in config", len(servers_config))
 
             # 存储所有 MCP server 管理器实例
             self.mcp_managers = {}
             self.funcs = {}
+            self._invalidate_tool_caches()
 
-            # 为每个 server 创建独立的 MCPServerManager 实例
+            # 为每个 server 创建独立的 MCPServerManager 实例并解析配置
+            managers = {}
             for server_name, server_config in servers_config.items():
-                print(f"[Info] Initializing MCP server: {server_name}")
+                logger.info("Initializing MCP server: %s", server_name)
 
                 try:
                     # 创建独立的 MCPServerManager 实例
                     mcp_manager = MCPServerManager()
 
                     # 构建配置字符串 (mcp_utils.py 需要的格式)
-                    server_json = json.dumps({
+                    server_conf = {
                         "mcpServers": {
                             server_name: server_config
                         }
-                    })
+                    }
+                    server_json = dumps_json(server_conf, pretty=False).decode('utf-8')
 
                     # 解析配置
                     if not mcp_manager.parse_config(server_json):
-                        print(f"[Warning] Failed to parse config for {server_name}")
+                        logger.warning("Failed to parse config for %s", server_name)
                         continue
 
+                    managers[server_name] = mcp_manager
+
+                except Exception as e:
+                    logger.error("Failed to load server %s: %s", server_name, e, exc_info=True)
+                    continue
+
+            # 启动和初始化都是子进程 + stdio 握手，各 server 之间并发执行
+            # 先全部提交再统一取结果，总耗时取决于最慢的 server 而不是总和
+            ready = []
+            if managers:
+                def collect(futures, action):
+                    succeeded = []
+                    for name, future in futures.items():
+                        try:
+                            if future.result():
+                                succeeded.append(name)
+                            else:
+                                logger.warning("Failed to %s server %s", action, name)
+                        except Exception as e:
+                            logger.error("Failed to load server %s: %s", name, e, exc_info=True)
+                    return succeeded
+
+                with ThreadPoolExecutor(max_workers=min(8, len(managers))) as executor:
                     # 启动 server 进程
-                    if not mcp_manager.start_ser(server_name):
-                        print(f"[Warning] Failed to start server {server_name}")
-                        continue
+                    start_futures = {name: executor.submit(m.start_ser, name) for name, m in managers.items()}
+                    started = collect(start_futures, "start")
 
                     # 初始化 server 并获取工具列表
-                    if not mcp_manager.init_ser(server_name):
-                        print(f"[Warning] Failed to initialize server {server_name}")
-                        continue
+                    init_futures = {name: executor.submit(managers[name].init_ser, name) for name in started}
+                    ready = collect(init_futures, "initialize")
 
-                    # 保存 manager 实例
-                    self.mcp_managers[server_name] = mcp_manager
+            # 按配置顺序注册已就绪 server 的工具
+            for server_name in ready:
+                mcp_manager = managers[server_name]
 
-                    # 为该 server 的所有工具创建函数
-                    server_tools = mcp_manager.tools.get(server_name, [])
-                    print(f"[Info] Server {server_name} provides {len(server_tools)} tools")
+                # 保存 manager 实例
+                self.mcp_managers[server_name] = mcp_manager
 
-                    for tool in server_tools:
-                        tool_name = tool.get('name', '')
-                        if not tool_name:
-                            continue
+                # 为该 server 的所有工具创建函数
+                server_tools = mcp_manager.tools.get(server_name, [])
+                logger.info("Server %s provides %s tools", server_name, len(server_tools))
 
-                        # 创建函数名: mcp_servername_toolname
-                        func_name = f"mcp_{server_name}_{tool_name}"
-                        tool_desc = tool.get('description', 'No description')
-
-                        # 创建工具函数 (使用闭包捕获 manager 和 server_name)
-                        def make_tool_func(manager, ser_name, t_name, t_desc):
-                            def tool_func(**kwargs):
-                                try:
-                                    result = manager.call_tool(ser_name, t_name, kwargs)
-                                    return json.dumps(result, ensure_ascii=False, indent=2)
-                                except Exception as e:
-                                    error_result = {"error": str(e)}
-                                    return json.dumps(error_result, ensure_ascii=False, indent=2)
-
-                            tool_func.__name__ = t_name
-                            tool_func.__doc__ = t_desc
-                            tool_func.__server_name__ = ser_name  # 标记属于哪个 server
-                            return tool_func
-
-                        self.funcs[func_name] = make_tool_func(
-                            mcp_manager, server_name, tool_name, tool_desc
-                        )
+                for tool in server_tools:
+                    tool_name = tool.get('name', '')
+                    if not tool_name:
+                        continue
 
-                        print(f"[Info]   - Loaded tool: {func_name}")
+                    # 创建函数名: mcp_servername_toolname
+                    func_name = f"mcp_{server_name}_{tool_name}"
+                    tool_desc = tool.get('description', 'No description')
 
-                except Exception as e:
-                    print(f"[Error] Failed to load server {server_name}: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    continue
+                    # 创建工具函数 (partial 绑定 manager 和 server_name)
+                    tool_func = functools.partial(_call_mcp_tool_safe, mcp_manager, server_name, tool_name)
+                    tool_func.__name__ = tool_name
+                    tool_func.__doc__ = tool_desc
+                    tool_func.__server_name__ = server_name  # 标记属于哪个 server
+                    self.funcs[func_name] = tool_func
+
+                    logger.debug("  - Loaded tool: %s", func_name)
 
             # 打印汇总信息
-            print(f"[Info] Successfully loaded {len(self.funcs)} MCP tools from {len(self.mcp_managers)} servers")
+            logger.info("Successfully loaded %s MCP tools from %s servers", len(self.funcs), len(self.mcp_managers))
 
             # 存储工具描述到字典(不直接加入 system_prompt)
             if self.funcs:
                 for func_name, func in self.funcs.items():
-                    doc = func.__doc__ or "No description"
-                    self.mcp_tools_desc[func_name] = doc
-                print(f"[Info] Loaded {len(self.mcp_tools_desc)} tools from MCP config")
+                    self._set_tool_desc(func_name, func.__doc__ or "No description")
+                self._invalidate_tool_caches()
+                logger.info("Loaded %s tools from MCP config", len(self.mcp_tools_desc))
             else:
-                print("[Warning] No MCP tools loaded")
+                logger.warning("No MCP tools loaded")
 
         except Exception as e:
-            print(f"[Error] Failed to load MCP config: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.error("Failed to load MCP config: %s", e, exc_info=True)
             # 降级到旧方法
-            print("[Info] Falling back to old MCP loading method")
+            logger.info("Falling back to old MCP loading method")
             self._load_mcp_from_paths()
     
     def load_mult_mcp_mod(self, mcp_paths):
         """加载多个MCP文件"""
         all_funcs = {}
         all_mods = []
-        
-        for path in mcp_paths:
-            mod, funcs = self.load_mcp_mod(path)
+
+        # .json 需要启动子进程，.py 需要执行模块，各文件之间并发加载；
+        # executor.map 按输入顺序返回，同名函数仍然以后加载的文件为准
+        if len(mcp_paths) > 1:
+            with ThreadPoolExecutor(max_workers=min(8, len(mcp_paths))) as executor:
+                results = list(executor.map(self.load_mcp_mod, mcp_paths))
+        else:
+            results = [self.load_mcp_mod(path) for path in mcp_paths]
+
+        for mod, funcs in results:
             if mod:
                 all_mods.append(mod)
             if funcs:
                 for func_name, func in funcs.items():
                     if func_name in all_funcs:
-                        print(f"[Warning] Function '{func_name}' exists in multiple MCP files, will use the last loaded version")
+                        logger.warning("Function '%s' exists in multiple MCP files, will use the last loaded version", func_name)
                     all_funcs[func_name] = func
         return all_mods, all_funcs
     
+    def _set_tool_desc(self, tool_name: str, doc: str):
+        """登记工具描述，同时预先生成系统提示中使用的描述文本"""
+        self.mcp_tools_desc[tool_name] = doc
+        self.mcp_tools_desc_rendered[tool_name] = _render_tool_desc(doc)
+
+    def _invalidate_tool_caches(self):
+        """工具集或命令格式变化后调用，使派生的工具描述缓存失效"""
+        self._tools_desc_dirty = True
+        self._tools_desc_cache = None
+        self._prompt_cache_key = None
+        self._prompt_cache_val = None
+        self._tools_list_cache = None
+        self.func_signatures.clear()
+
     def gen_tools_desc(self):
-        """生成工具描述 - 不截断任何描述"""
-        print(f"[Debug] mcp_tools_desc keys: {list(self.mcp_tools_desc.keys())}")
-        print(f"[Debug] funcs keys: {list(self.funcs.keys())}")
+        """生成工具描述 - 不截断任何描述（结果缓存到工具集变化为止）"""
+        if not self._tools_desc_dirty:
+            return self._tools_desc_cache
 
         if not self.mcp_tools_desc:
-            print("[Debug] mcp_tools_desc is empty, returning empty string")
+            self._tools_desc_cache = ""
+            self._tools_desc_dirty = False
             return ""
 
-        desc = "【Available Tools】\nYou can use the following tools:\n\n"
+        parts = ["【Available Tools】\nYou can use the following tools:\n\n"]
 
         # 按服务器分组工具
-        server_tools = {}
-        for func_name in self.mcp_tools_desc.keys():
-            if func_name in self.funcs:
-                func = self.funcs[func_name]
+        server_tools = defaultdict(list)
+        for func_name, doc in self.mcp_tools_desc.items():
+            func = self.funcs.get(func_name)
+            if func is not None:
                 server_name = getattr(func, '__server_name__', 'Other')
-
-                if server_name not in server_tools:
-                    server_tools[server_name] = []
-
-                doc = self.mcp_tools_desc[func_name]
                 server_tools[server_name].append({
                     'name': func_name,
                     'desc': doc
@@ -691,26 +1227,25 @@ Please strictly follow these rules to ensure responses are concise, accurate, an
 
         # 为每个 server 生成工具描述(不截断)
         for server_name, tools in server_tools.items():
-            desc += f"─── {server_name.upper()} SERVER ───\n"
+            parts.append(f"─── {server_name.upper()} SERVER ───\n")
 
             for tool in tools:
-                tool_name = tool['name']
-                tool_desc = tool['desc']
-
-                desc += f"  • {tool_name}\n"
-                desc += f"    {tool_desc}\n\n"
+                parts.append(f"  • {tool['name']}\n")
+                parts.append(f"    {tool['desc']}\n\n")
 
         # 添加使用示例
-        desc += f"\n【Tool Usage】\n"
-        desc += f"Format: {self.command_start} tool_name {self.command_separator} key1=value1 {self.command_separator} key2=value2\n"
-        desc += f"Example: {self.command_start} mcp_filesystem_read_file {self.command_separator} path=/path/to/file.txt\n\n"
+        parts.append("\n【Tool Usage】\n")
+        parts.append(f"Format: {self.command_start} tool_name {self.command_separator} key1=value1 {self.command_separator} key2=value2\n")
+        parts.append(f"Example: {self.command_start} mcp_filesystem_read_file {self.command_separator} path=/path/to/file.txt\n\n")
 
-        desc += "【Important Notes】\n"
-        desc += "1. Use key=value format for parameters\n"
-        desc += "2. Parameter values should be properly escaped/quoted if needed\n"
-        desc += "3. Only use tools from the list above\n"
+        parts.append("【Important Notes】\n")
+        parts.append("1. Use key=value format for parameters\n")
+        parts.append("2. Parameter values should be properly escaped/quoted if needed\n")
+        parts.append("3. Only use tools from the list above\n")
 
-        return desc
+        self._tools_desc_cache = "".join(parts)
+        self._tools_desc_dirty = False
+        return self._tools_desc_cache
 
     def _get_tool_description_reading_prompt(self) -> str:
         """
@@ -718,138 +1253,35 @@ Please strictly follow these rules to ensure responses are concise, accurate, an
         这个提示词始终会被添加到系统提示中（当有工具启用时），确保 AI 仔细阅读工具描述
         这是框架级逻辑，不涉及用户自定义内容
         """
-        return """【CRITICAL: Tool Description Reading Requirements - MANDATORY】
-
-**MUST READ COMPLETE DESCRIPTIONS:**
-You MUST carefully read the ENTIRE description for EACH tool before using it.
-
-**PAY SPECIAL ATTENTION TO:**
-Sections marked with:
-- 'CRITICAL' or '**CRITICAL**'
-- 'MUST' or '**MUST**'
-- 'REQUIREMENT' or '**REQUIREMENT**'
-- 'WORKFLOW' or '**WORKFLOW**'
-- 'PREREQUISITE' or '**PREREQUISITE**'
-
-**WHY THIS MATTERS:**
-These highlighted sections contain CRITICAL information about:
-- Required setup steps BEFORE using the tool
-- Dependencies on OTHER tools that must be called FIRST
-- Correct usage patterns and parameter order
-- Common mistakes to AVOID
-- Multi-step workflows that MUST be followed
-
-**EXAMPLES OF CRITICAL WORKFLOWS:**
-- Some file operations REQUIRE calling system information tools FIRST
-- Some operations have specific prerequisite steps
-- Some tools depend on results from other tools
-- Tool descriptions will tell you the exact workflow to follow
-
-**MANDATORY PRACTICE:**
-1. BEFORE calling any tool: Read its COMPLETE description
-2. Look for 'CRITICAL', 'MUST', 'REQUIREMENT' markers
-3. Follow documented workflows EXACTLY
-4. NEVER skip steps marked as 'REQUIRED' or 'MUST'
-5. If a description says "Call X first", ALWAYS call X first
-
-**CONSEQUENCES OF NOT READING:**
-Skipping these sections will cause operations to FAIL because you won't have:
-- Required information from prerequisite tools
-- Correct parameter values
-- Proper setup completed
-
-FAILURE TO FOLLOW TOOL DESCRIPTION WORKFLOWS WILL RESULT IN ERRORS."""
+        return _TOOL_DESC_READING_PROMPT
 
     def _get_markdown_format_prompt(self) -> str:
         """
         获取硬编码的 Markdown 格式规范提示词
         这个提示词始终会被添加到系统提示中，确保 AI 正确使用 Markdown 格式
         """
-        return """【CRITICAL: Markdown Formatting Requirements - MANDATORY】
-
-**MANDATORY LINE BREAK RULES:**
-You MUST use blank lines between different Markdown elements (lists, sections, code blocks).
-- NEVER cram multiple items into one paragraph
-- ALWAYS add a blank line BEFORE each list (bullet or numbered)
-- ALWAYS add a blank line BETWEEN different sections
-- ALWAYS add a blank line BEFORE and AFTER code blocks
-
-**Correct Format:**
-```
-Here are the items:
-
-- Item 1
-- Item 2
-- Item 3
-```
-
-**Wrong Format:**
-```
-Here are the items: - Item 1 - Item 2 - Item 3
-```
-
-**MANDATORY STRUCTURE:**
-1. Start with a brief summary (2-3 sentences max)
-
-2. Use ## for main sections (with blank line before)
-
-3. Use - or * for bullet points (with blank line before list)
-
-4. Use numbered lists (1. 2. 3.) for steps (with blank line before list)
-
-5. Use ```language for code blocks (with blank lines before/after)
-
-6. End with a brief conclusion
-
-**LANGUAGE RULE:**
-Respond in the SAME language as the user's message (Chinese→Chinese, English→English).
-
-**Line Break Examples:**
-
-GOOD:
-```
-Found 5 files:
-
-1. file1.txt
-2. file2.txt
-3. file3.txt
-```
-
-BAD:
-```
-Found 5 files: 1. file1.txt 2. file2.txt 3. file3.txt
-```
-
-GOOD:
-```
-Categories:
-
-- Programming
-- Tools
-- Documents
-```
-
-BAD:
-```
-Categories: - Programming - Tools - Documents
-```
-
-**Code Format:**
-Always use triple backticks with language (blank lines before/after):
-
-```python
-print('hello')
-```
-
-VIOLATION OF THESE FORMATTING RULES WILL RESULT IN POOR USER EXPERIENCE.
-STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
+        return _MARKDOWN_FORMAT_PROMPT
 
     def get_effective_system_prompt(self):
         """
         获取有效的系统提示
         将选中的 MCP 工具描述与用户 system_prompt 组合
         注意：返回的提示词已经包含了硬编码的 Markdown 格式规范
+
+        结果按 (用户提示, 已启用工具集合, 命令格式) 缓存，启用/禁用工具或直接
+        修改这些属性都会自然失效；已加载工具集变化时由 _invalidate_tool_caches 清空
         """
+        key = (self.user_system_prompt, frozenset(self.enabled_mcp_tools),
+               self.command_start, self.command_separator)
+        if key == self._prompt_cache_key:
+            return self._prompt_cache_val
+
+        prompt = self._build_effective_system_prompt()
+        self._prompt_cache_key, self._prompt_cache_val = key, prompt
+        return prompt
+
+    def _build_effective_system_prompt(self):
+        """组合有效的系统提示（不使用缓存）"""
         base_prompt = self.user_system_prompt  # 使用用户的原始提示，不包含 Markdown 规范
 
         # No debug output for system prompt generation (reduced verbosity)
@@ -862,59 +1294,83 @@ STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
                     enabled_desc[tool_name] = self.mcp_tools_desc[tool_name]
 
             if enabled_desc:
-                # 生成已启用工具的描述
-                desc = "【Available Tools】\nYou can use the following tools:\n\n"
+                # 生成已启用工具的描述（逐段收集，最后一次性拼接）
+                parts = ["【Available Tools】\nYou can use the following tools:\n\n"]
 
                 # 按服务器分组
-                server_tools = {}
-                for tool_name in enabled_desc.keys():
+                server_tools = defaultdict(list)
+                for tool_name, tool_desc in enabled_desc.items():
                     if tool_name in self.funcs:
-                        func = self.funcs[tool_name]
-                        server_name = getattr(func, '__server_name__', 'Other')
-
-                        if server_name not in server_tools:
-                            server_tools[server_name] = []
-
+                        server_name = getattr(self.funcs[tool_name], '__server_name__', 'Other')
                         server_tools[server_name].append({
                             'name': tool_name,
-                            'desc': enabled_desc[tool_name]
+                            'desc': tool_desc
                         })
 
                 # 生成完整描述 - 显示工具描述，但不列出工具名列表
-                for server_name, tools in server_tools.items():
-                    desc += f"─── {server_name.upper()} SERVER ───\n"
-                    desc += f"   Available tools: {len(tools)}\n\n"
+                # server 和工具都按名称排序，与启用顺序（集合迭代顺序）无关，保证提示词字节稳定
+                for server_name in sorted(server_tools):
+                    tools = server_tools[server_name]
+                    parts.append(f"─── {server_name.upper()} SERVER ───\n")
+                    parts.append(f"   Available tools: {len(tools)}\n\n")
 
                     # 显示每个工具的描述（不包含工具名）
-                    for tool in tools:
-                        tool_desc = tool['desc']
-                        # 确保描述强调位置参数
-                        if "CORRECT:" not in tool_desc and "WRONG:" not in tool_desc:
-                            # 如果描述中没有使用示例，添加一个通用的使用说明
-                            tool_desc += "\n\nIMPORTANT: Call with positional arguments only, do NOT use parameter names."
-                        desc += f"{tool_desc}\n\n"
+                    # 描述在登记时已补充位置参数提示（见 _set_tool_desc）
+                    rendered = self.mcp_tools_desc_rendered
+                    for tool in sorted(tools, key=lambda t: t['name']):
+                        tool_desc = rendered.get(tool['name'])
+                        if tool_desc is None:
+                            tool_desc = _render_tool_desc(tool['desc'])
+                        parts.append(tool_desc)
+                        parts.append("\n\n")
 
                 # 添加使用说明 - 强调位置参数，不要用 key=value 格式
-                desc += f"\n【Tool Usage】\n"
-                desc += f"IMPORTANT: Call tools with POSITIONAL arguments only, NOT named parameters.\n\n"
-                desc += f"CORRECT format: {self.command_start} tool_name {self.command_separator} value1 {self.command_separator} value2\n"
-                desc += f"WRONG format: {self.command_start} tool_name {self.command_separator} param1=value1 {self.command_separator} param2=value2\n\n"
-                desc += f"Example: {self.command_start} ls {self.command_separator} /home/user/documents\n"
-                desc += f"NOT: {self.command_start} ls {self.command_separator} directory=/home/user/documents\n\n"
-
-                desc += "【Important Notes】\n"
-                desc += "1. Pass ONLY values, do NOT include parameter names\n"
-                desc += "2. Pass parameters in the correct order as shown in tool descriptions\n"
-                desc += "3. String values should NOT be quoted (unless they contain spaces)\n"
-                desc += "4. Use tools based on their descriptions and parameter requirements\n"
-
-                # 组合:工具描述 + \n\n + 框架级工具描述阅读要求 + 用户 system_prompt + 硬编码 Markdown 规范
-                final_prompt = desc + "\n\n" + self._get_tool_description_reading_prompt() + "\n\n" + base_prompt + "\n\n" + self._get_markdown_format_prompt()
+                start, sep = self.command_start, self.command_separator
+                parts.append(
+                    "\n【Tool Usage】\n"
+                    "IMPORTANT: Call tools with POSITIONAL arguments only, NOT named parameters.\n\n"
+                    f"CORRECT format: {start} tool_name {sep} value1 {sep} value2\n"
+                    f"WRONG format: {start} tool_name {sep} param1=value1 {sep} param2=value2\n\n"
+                    f"Example: {start} ls {sep} /home/user/documents\n"
+                    f"NOT: {start} ls {sep} directory=/home/user/documents\n\n"
+                    "【Important Notes】\n"
+                    "1. Pass ONLY values, do NOT include parameter names\n"
+                    "2. Pass parameters in the correct order as shown in tool descriptions\n"
+                    "3. String values should NOT be quoted (unless they contain spaces)\n"
+                    "4. Use tools based on their descriptions and parameter requirements\n"
+                )
+                desc = "".join(parts)
+
+                # 组合:稳定内容在前、随启用工具变化的内容在后，便于服务端前缀缓存命中
+                # 硬编码 Markdown 规范 + 用户 system_prompt + 框架级工具描述阅读要求 + 工具描述
+                final_prompt = self._get_markdown_format_prompt() + "\n\n" + base_prompt + "\n\n" + self._get_tool_description_reading_prompt() + "\n\n" + desc
 
                 return final_prompt
 
-        # No tools enabled, return 用户 system_prompt + 硬编码 Markdown 规范
-        return base_prompt + "\n\n" + self._get_markdown_format_prompt()
+        # No tools enabled, return 硬编码 Markdown 规范 + 用户 system_prompt
+        return self._get_markdown_format_prompt() + "\n\n" + base_prompt
+
+    def _copy_with_system_prompt(self, history: List[Dict]) -> List[Dict]:
+        """复制历史并确保开头是当前的有效系统提示
+
+        - 没有系统消息时在复制的同时补上（避免先 copy 再 insert(0) 整体后移）
+        - 开头是本实例上次写入的有效系统提示但内容已过期（如启用的工具变化）时，只替换第一条
+        - 内容相同或是外部提供的系统提示（如 API 服务附加了历史说明）时原样保留，保证前缀缓存可以命中
+        """
+        # 使用有效的系统提示(包含已启用的 MCP 工具)，已缓存，每次获取开销很小
+        effective_prompt = self.get_effective_system_prompt()
+        if not history or history[0].get("role") != "system":
+            self._last_system_prompt = effective_prompt
+            return [{"role": "system", "content": effective_prompt}, *history]
+
+        current_history = list(history)
+        content = history[0].get("content")
+        previous_prompt = self._last_system_prompt
+        if (previous_prompt is not None and previous_prompt != effective_prompt
+                and content == previous_prompt):
+            current_history[0] = {**history[0], "content": effective_prompt}
+            self._last_system_prompt = effective_prompt
+        return current_history
 
     def set_tool_enabled(self, tool_name: str, enabled: bool):
         """设置工具是否启用"""
@@ -952,144 +1408,273 @@ STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
 
         # Disable proxy to avoid SSL/TLS issues
         # This fixes the "[SSL: WRONG_VERSION_NUMBER]" error when using HTTP proxies
-        import httpx
+        # 同一 api_base 的所有 AI 实例共享一个连接池，新对话无需重新握手
+        self.client = OpenAI(
+            api_key=api_key,
+            base_url=self.api_base,
+            http_client=_get_http_client(self.api_base)
+        )
 
-        # Create a mount that bypasses proxy for all URLs
-        no_proxy_mount = httpx.HTTPTransport(verify=True)
+        # 异步客户端只在需要时创建（见 _get_async_client），多数实例只使用同步接口
+        # 重新初始化（如 update_config 修改了 api_key / api_base / model）时先关闭旧的连接池
+        self._release_async_client()
+        logger.info("API client initialized with model: %s (proxy disabled)", self.model)
+
+    def _new_async_client(self) -> AsyncOpenAI:
+        """创建异步客户端（同样绕过代理）
+
+        异步连接池绑定创建它的事件循环，因此不在实例间共享
+        """
+        import httpx
 
-        # Create client with custom mount
-        http_client = httpx.Client(
+        no_proxy_async_mount = httpx.AsyncHTTPTransport(verify=True)
+        async_http_client = httpx.AsyncClient(
             mounts={
-                "http://": no_proxy_mount,
-                "https://": no_proxy_mount,
+                "http://": no_proxy_async_mount,
+                "https://": no_proxy_async_mount,
             },
             timeout=60.0
         )
 
-        self.client = OpenAI(
-            api_key=api_key,
+        return AsyncOpenAI(
+            api_key=self.api_key,
             base_url=self.api_base,
-            http_client=http_client
+            http_client=async_http_client
         )
-        print(f"[Info] API client initialized with model: {self.model} (proxy disabled)")
+
+    def _get_async_client(self) -> AsyncOpenAI:
+        """获取（或首次使用时创建）本实例的异步客户端，只在事件循环中调用
+
+        客户端的连接池绑定在创建它的事件循环上，在其他循环中调用时（如再次 asyncio.run）重新创建
+        """
+        loop = asyncio.get_running_loop()
+        if self.aclient is not None and self._aclient_loop is not loop:
+            self._release_async_client()
+        if self.aclient is None:
+            self.aclient = self._new_async_client()
+            self._aclient_loop = loop
+        return self.aclient
+
+    def _release_async_client(self):
+        """丢弃异步客户端并关闭它的连接池
+
+        创建它的事件循环仍在运行时把关闭调度到该循环上（可从任意线程调用）；
+        该循环已结束时连接不会再被使用，在当前线程中尽量释放
+        """
+        client, loop = self.aclient, self._aclient_loop
+        self.aclient = self._aclient_loop = None
+        if client is None:
+            return
+
+        if loop is not None and loop.is_running():
+            asyncio.run_coroutine_threadsafe(client.close(), loop)
+            return
+
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        try:
+            if running is not None:
+                task = running.create_task(client.close())
+                self._aclient_close_tasks.add(task)
+                task.add_done_callback(self._aclient_close_done)
+            else:
+                asyncio.run(client.close())
+        except Exception as e:
+            logger.debug("Failed to close async client: %s", e)
+
+    def _aclient_close_done(self, task: asyncio.Task):
+        """关闭任务完成后释放引用，并记录关闭时的异常"""
+        self._aclient_close_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug("Failed to close async client: %s", task.exception())
+
+    async def aclose(self):
+        """关闭异步客户端，供在事件循环中丢弃实例的调用方（如 API 服务）使用"""
+        if self.aclient is not None and self._aclient_loop is asyncio.get_running_loop():
+            client = self.aclient
+            self.aclient = self._aclient_loop = None
+            await client.close()
+        else:
+            self._release_async_client()
+
+    async def achat(self, messages: List[Dict], **kwargs) -> str:
+        """异步发送单次非流式请求，返回回复内容（不执行命令）"""
+        return await self._achat(self._get_async_client(), messages, **kwargs)
+
+    async def _achat(self, client: AsyncOpenAI, messages: List[Dict], **kwargs) -> str:
+        """使用指定的异步客户端发送单次非流式请求"""
+        api_params = {
+            **self._base_api_params(),
+            "messages": messages,
+            "stream": False
+        }
+
+        api_params.update(kwargs)
+
+        response = await client.chat.completions.create(**api_params)
+        return response.choices[0].message.content
+
+    async def abatch(self, list_of_messages: List[List[Dict]], max_concurrency: int = 8, **kwargs) -> List[str]:
+        """并发发送多组消息，结果顺序与输入一致"""
+        return await self._abatch(self._get_async_client(), list_of_messages, max_concurrency, **kwargs)
+
+    async def _abatch(self, client: AsyncOpenAI, list_of_messages: List[List[Dict]], max_concurrency: int, **kwargs) -> List[str]:
+        """使用指定的异步客户端并发发送多组消息"""
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def _limited(messages):
+            async with semaphore:
+                return await self._achat(client, messages, **kwargs)
+
+        return await asyncio.gather(*(_limited(m) for m in list_of_messages))
+
+    def batch(self, list_of_messages: List[List[Dict]], max_concurrency: int = 8, **kwargs) -> List[str]:
+        """abatch 的同步入口，供不在事件循环中的调用方使用
+
+        每次调用都在新的事件循环中运行，因此使用独立的异步客户端并在结束时关闭，
+        不复用绑定在其他事件循环上的 self.aclient
+        """
+        async def _run():
+            async with self._new_async_client() as client:
+                return await self._abatch(client, list_of_messages, max_concurrency, **kwargs)
+
+        return asyncio.run(_run())
     
+    def _base_api_params(self) -> Dict:
+        """请求中不随消息变化的参数：model、temperature 及非 None 的可选参数
+
+        按当前配置值缓存，update_config 或直接修改属性后自动重建
+        """
+        key = (self.model, self.temperature, self.max_tokens, self.top_p,
+               self.stop, self.presence_penalty, self.frequency_penalty)
+        if key != self._api_params_key:
+            params = {"model": self.model, "temperature": self.temperature}
+            optional_params = {
+                "max_tokens": self.max_tokens,
+                "top_p": self.top_p,
+                "stop": self.stop,
+                "presence_penalty": self.presence_penalty,
+                "frequency_penalty": self.frequency_penalty
+            }
+            for param, value in optional_params.items():
+                if value is not None:
+                    params[param] = value
+            self._api_params_key, self._api_params_val = key, params
+        return self._api_params_val
+
+    def _set_execution_status(self, status: str, tool_name=None, tool_args=None, started: bool = False):
+        """更新执行状态（started=True 时记录开始时间）"""
+        if status == "idle" and tool_name is None and tool_args is None and not started:
+            self.execution_status = _IDLE_STATUS
+            return
+        self.execution_status = {
+            "status": status,
+            "tool_name": tool_name,
+            "tool_args": tool_args,
+            "start_time": datetime.now().isoformat() if started else None
+        }
+
     def set_stop_flag(self, value: bool):
         """设置停止标志"""
         self._stop_flag = value
         if value:
-            self.execution_status = {
-                "status": "idle",
-                "tool_name": None,
-                "tool_args": None,
-                "start_time": None
-            }
-            print(f"[Info] Stop flag set to True, execution interrupted")
+            self._set_execution_status("idle")
+            logger.info("Stop flag set to True, execution interrupted")
     
     def get_stop_flag(self):
         """获取当前停止标志值"""
         return self._stop_flag
     
+    def _split_command(self, command_line: str, first_line_only: bool = False) -> List[str]:
+        """把以 command_start 开头的命令拆分为 [tool_name, arg1, ...]
+
+        只截掉开头的标记，不对整段回复做 replace 扫描；参数默认可以跨行（如写入文件的文本），
+        first_line_only=True 时只解析第一行（流式提前结束的路径，命令行之后的内容尚未接收完整）；
+        最多拆分 _MAX_COMMAND_SPLITS 次，超出部分保留在最后一个参数中
+        """
+        payload = command_line[len(self.command_start):]
+        if first_line_only:
+            payload = payload.partition('\n')[0]
+        return [t.strip() for t in payload.split(self.command_separator, _MAX_COMMAND_SPLITS)]
+
     def exec_func(self, func_name, *args):
         """执行函数，带状态跟踪和停止标志支持"""
         if self.get_stop_flag():
             return "Execution interrupted by user"
         
-        if func_name not in self.funcs:
+        # 工具表是 {名称: 可调用对象} 字典，查找一次后复用
+        func = self.funcs.get(func_name)
+        if func is None:
             return f"Error: Function '{func_name}' does not exist"
         
         try:
             # 更新执行状态
-            self.execution_status = {
-                "status": "executing_tool",
-                "tool_name": func_name,
-                "tool_args": args,
-                "start_time": datetime.now().isoformat()
-            }
+            self._set_execution_status("executing_tool", tool_name=func_name, tool_args=args, started=True)
             
-            print(f"[Debug] Executing function: {func_name} with args: {args}")
+            logger.debug("Executing function: %s with args: %s", func_name, args)
             
             # 检查停止标志
             if self.get_stop_flag():
-                self.execution_status = {
-                    "status": "stopped",
-                    "tool_name": None,
-                    "tool_args": None,
-                    "start_time": None
-                }
+                self._set_execution_status("stopped")
                 return "Execution interrupted by user before execution"
             
             # 处理MCP函数
             if func_name.startswith('mcp_'):
                 kwargs = {}
                 for arg in args:
-                    if '=' in arg:
-                        key, value = arg.split('=', 1)
+                    key, sep, value = arg.partition('=')
+                    if sep:
                         kwargs[key.strip()] = value.strip()
-                    elif arg.strip():
-                        kwargs['value'] = arg.strip()
+                    else:
+                        arg = arg.strip()
+                        if arg:
+                            kwargs['value'] = arg
                 
-                print(f"[Debug] Calling MCP function with kwargs: {kwargs}")
+                logger.debug("Calling MCP function with kwargs: %s", kwargs)
                 
                 # 检查停止标志
                 if self.get_stop_flag():
-                    self.execution_status = {
-                        "status": "stopped",
-                        "tool_name": None,
-                        "tool_args": None,
-                        "start_time": None
-                    }
+                    self._set_execution_status("stopped")
                     return "Execution interrupted by user before MCP execution"
                 
-                res = self.funcs[func_name](**kwargs)
+                res = func(**kwargs)
             else:
-                print(f"[Debug] Calling regular function with args: {args}")
+                logger.debug("Calling regular function with args: %s", args)
                 
                 # 检查停止标志
                 if self.get_stop_flag():
-                    self.execution_status = {
-                        "status": "stopped",
-                        "tool_name": None,
-                        "tool_args": None,
-                        "start_time": None
-                    }
+                    self._set_execution_status("stopped")
                     return "Execution interrupted by user before function execution"
                 
                 # 尝试执行函数，如果参数错误，提供更多信息
                 try:
-                    res = self.funcs[func_name](*args)
+                    res = func(*args)
                 except TypeError as e:
-                    # 获取函数签名
-                    import inspect
-                    func = self.funcs[func_name]
-                    sig = inspect.signature(func)
-                    expected_args = list(sig.parameters.keys())
+                    # 获取函数签名（按工具缓存，模型反复传错参数时不再重复内省）
+                    expected_args = self.func_signatures.get(func_name)
+                    if expected_args is None:
+                        expected_args = list(inspect.signature(func).parameters.keys())
+                        self.func_signatures[func_name] = expected_args
                     
                     error_msg = f"Parameter error: {e}\nExpected parameters: {expected_args}"
-                    print(f"[Error] {error_msg}")
+                    logger.error("%s", error_msg)
                     return f"Execution failed: {error_msg}"
             
-            print(f"[Debug] Function execution result: {res[:100]}..." if len(str(res)) > 100 else f"[Debug] Function execution result: {res}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Function execution result: %s", _truncate(str(res)))
             
             # 重置执行状态
-            self.execution_status = {
-                "status": "idle",
-                "tool_name": None,
-                "tool_args": None,
-                "start_time": None
-            }
+            self._set_execution_status("idle")
             
             return f"Execution successful: {res}"
         
         except Exception as e:
-            print(f"[Error] Function execution failed: {e}")
+            logger.error("Function execution failed: %s", e)
             
             # 重置执行状态
-            self.execution_status = {
-                "status": "idle",
-                "tool_name": None,
-                "tool_args": None,
-                "start_time": None
-            }
+            self._set_execution_status("idle")
             
             return f"Execution failed: {e}"
             
@@ -1106,16 +1691,10 @@ STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
             str: AI's complete response
         """
         # Use external history if provided, otherwise use internal history
-        if external_history:
-            current_history = external_history.copy()
-        else:
-            current_history = self.conv_his.copy()
+        source_history = external_history if external_history else self.conv_his
 
         # Ensure system prompt is at the beginning
-        if not current_history or current_history[0].get("role") != "system":
-            # 使用有效的系统提示(包含已启用的 MCP 工具)
-            effective_prompt = self.get_effective_system_prompt()
-            current_history.insert(0, {"role": "system", "content": effective_prompt})
+        current_history = self._copy_with_system_prompt(source_history)
         
         # Add user input to history
         current_history.append({"role": "user", "content": user_input})
@@ -1123,101 +1702,71 @@ STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
         iteration = 0
         full_response = ""
         
-        print(f"[AI] Processing with history (length: {len(current_history)}), iteration limit: {self.max_iterations}")
+        logger.debug("Processing with history (length: %s), iteration limit: %s", len(current_history), self.max_iterations)
         
         while iteration < self.max_iterations:
             if self.get_stop_flag():
                 self.set_stop_flag(False)
-                self.execution_status = {
-                    "status": "idle",
-                    "tool_name": None,
-                    "tool_args": None,
-                    "start_time": None
-                }
+                self._set_execution_status("idle")
                 return "**Execution stopped**\nProcessing was interrupted by user."
             
             try:
                 # Prepare API parameters
                 api_params = {
-                    "model": self.model,
-                    "temperature": self.temperature,
+                    **self._base_api_params(),
                     "messages": current_history,
                     "stream": False  # Non-streaming for internal processing
                 }
                 
-                # Add optional parameters
-                optional_params = {
-                    "max_tokens": self.max_tokens,
-                    "top_p": self.top_p,
-                    "stop": self.stop,
-                    "presence_penalty": self.presence_penalty,
-                    "frequency_penalty": self.frequency_penalty
-                }
-                
-                for param, value in optional_params.items():
-                    if value is not None:
-                        api_params[param] = value
-                
-                print(f"[AI] Sending request to API with {len(current_history)} messages (iteration {iteration + 1})")
+                logger.debug("Sending request to API with %s messages (iteration %s)", len(current_history), iteration + 1)
                 
                 # Execute API call
                 response = self.client.chat.completions.create(**api_params)
                 get_reply = response.choices[0].message.content
                 full_response += get_reply
                 
-                print(f"[AI] Received reply: {get_reply[:100]}..." if len(get_reply) > 100 else f"[AI] Received reply: {get_reply}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Received reply: %s", _truncate(get_reply))
                 
                 # Check if AI wants to execute a command
                 if get_reply.startswith(self.command_start):
-                    print(f"\n[AI][Iteration {iteration + 1}] Command detected: {get_reply}")
+                    logger.debug("[Iteration %s] Command detected: %s", iteration + 1, get_reply)
                     
                     # Add AI reply to history
                     current_history.append({"role": "assistant", "content": get_reply})
                     
                     # Parse command - extract ONLY the first command
-                    # Sometimes AI outputs multiple commands in one response
-                    command_line = get_reply
-                    
-                    # If there are multiple commands, take only the first one
-                    if '\n' in get_reply:
-                        lines = get_reply.split('\n')
-                        for line in lines:
-                            if line.startswith(self.command_start):
-                                command_line = line
-                                break
+                    # Sometimes AI outputs multiple commands in one response.
+                    # The reply starts with command_start, so its first line is the command line
+                    nl = get_reply.find('\n')
+                    command_line = get_reply if nl < 0 else get_reply[:nl]
                     
                     # Parse the command
-                    tokens = command_line.replace(self.command_start, "").strip().split(self.command_separator)
-                    tokens = [t.strip() for t in tokens if t.strip()]
+                    tokens = [t for t in self._split_command(command_line) if t]
                     
-                    if len(tokens) < 1:
+                    if not tokens:
                         res = "Error: Command format is incorrect. Please use: {command_start} tool_name {command_separator} param1 {command_separator} param2"
                     else:
-                        func_name = tokens[0]
-                        args = tokens[1:] if len(tokens) > 1 else []
-                        
-                        print(f"[AI] Executing command: {func_name} with args: {args}")
+                        func_name, *args = tokens
+
+                        # Check if command exists - a local lookup, so there is nothing to execute or wait for
+                        if func_name not in self.funcs:
+                            # Command doesn't exist - add feedback and let AI try again
+                            error_feedback = f"Tool '{func_name}' is not available. Please use only available tools from the list provided in the system prompt."
+                            current_history.append({
+                                "role": "user",
+                                "content": error_feedback
+                            })
+
+                            iteration += 1
+                            continue
+
+                        logger.debug("Executing command: %s with args: %s", func_name, args)
                         
                         # Execute function
                         res = self.exec_func(func_name, *args)
                     
-                    print(f"[AI] Command execution result: {res[:200]}...")
-                    
-                    # Check if command exists
-                    if "does not exist" in res or "Error: Function" in res:
-                        # Command doesn't exist - add feedback and let AI try again
-                        error_feedback = f"Tool '{func_name}' is not available. Please use only available tools from the list provided in the system prompt."
-                        current_history.append({
-                            "role": "user",
-                            "content": error_feedback
-                        })
-                        
-                        # Add a small delay to prevent rapid retries
-                        import time
-                        time.sleep(0.5)
-                        
-                        iteration += 1
-                        continue
+                    logger.debug("Command execution result: %.200s...", res)
                     
                     # Add execution result to history with guidance
                     current_history.append({
@@ -1230,35 +1779,20 @@ STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
                 else:
                     # No command, processing is complete
                     current_history.append({"role": "assistant", "content": get_reply})
-                    self.execution_status = {
-                        "status": "idle",
-                        "tool_name": None,
-                        "tool_args": None,
-                        "start_time": None
-                    }
+                    self._set_execution_status("idle")
                     
                     return full_response
                     
             except Exception as e:
-                print(f"[AI] Error processing user input: {e}")
+                logger.error("Error processing user input: %s", e)
                 
                 # Reset execution status
-                self.execution_status = {
-                    "status": "idle",
-                    "tool_name": None,
-                    "tool_args": None,
-                    "start_time": None
-                }
+                self._set_execution_status("idle")
                 
                 return f"Error occurred during processing: {e}"
         
         # Reached maximum iterations
-        self.execution_status = {
-            "status": "idle",
-            "tool_name": None,
-            "tool_args": None,
-            "start_time": None
-        }
+        self._set_execution_status("idle")
         
         return f"{full_response}\n\n[Note: Reached maximum execution steps ({self.max_iterations}), task may not be fully completed]"
 
@@ -1270,12 +1804,7 @@ STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
             return "**Execution stopped**\nProcessing was interrupted by user."
         
         # 设置处理状态
-        self.execution_status = {
-            "status": "processing",
-            "tool_name": None,
-            "tool_args": None,
-            "start_time": datetime.now().isoformat()
-        }
+        self._set_execution_status("processing", started=True)
         
         # 添加用户输入到历史
         history.append({"role": "user", "content": user_input})
@@ -1285,95 +1814,61 @@ STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
         
         while iteration < self.max_iterations:
             if self.get_stop_flag():
-                print(f"[Info] Stop flag detected, stopping execution at iteration {iteration}")
-                self.execution_status = {
-                    "status": "idle",
-                    "tool_name": None,
-                    "tool_args": None,
-                    "start_time": None
-                }
+                logger.info("Stop flag detected, stopping execution at iteration %s", iteration)
+                self._set_execution_status("idle")
                 self.set_stop_flag(False)
                 return "**Execution stopped**\nProcessing was interrupted by user."
             
             try:
                 # 准备API参数
                 api_params = {
-                    "model": self.model,
-                    "temperature": self.temperature,
+                    **self._base_api_params(),
                     "messages": history,
                     "stream": False  # 非流式用于内部处理
                 }
                 
-                # 添加可选参数
-                optional_params = {
-                    "max_tokens": self.max_tokens,
-                    "top_p": self.top_p,
-                    "stop": self.stop,
-                    "presence_penalty": self.presence_penalty,
-                    "frequency_penalty": self.frequency_penalty
-                }
-                
-                for param, value in optional_params.items():
-                    if value is not None:
-                        api_params[param] = value
-                
-                print(f"[Debug] Sending request to API with {len(history)} messages (iteration {iteration + 1})")
+                logger.debug("Sending request to API with %s messages (iteration %s)", len(history), iteration + 1)
                 
                 # 执行API调用
                 response = self.client.chat.completions.create(**api_params)
                 get_reply = response.choices[0].message.content
                 full_response += get_reply
                 
-                print(f"[Debug] Received reply: {get_reply[:100]}..." if len(get_reply) > 100 else f"[Debug] Received reply: {get_reply}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Received reply: %s", _truncate(get_reply))
                 
                 if self.get_stop_flag():
-                    self.execution_status = {
-                        "status": "idle",
-                        "tool_name": None,
-                        "tool_args": None,
-                        "start_time": None
-                    }
+                    self._set_execution_status("idle")
                     self.set_stop_flag(False)
                     return "**Execution stopped**\nProcessing was interrupted by user."
                 
                 if get_reply.startswith(self.command_start):
-                    print(f"\n[Iteration {iteration + 1}][AI requested execution] {get_reply}")
+                    logger.debug("[Iteration %s] AI requested execution: %s", iteration + 1, get_reply)
                     
                     # 添加AI回复到历史
                     history.append({"role": "assistant", "content": get_reply})
                     
                     # 解析命令
-                    tokens = get_reply.replace(self.command_start, "").strip().split(self.command_separator)
-                    tokens = [t.strip() for t in tokens]
+                    tokens = self._split_command(get_reply)
                     
-                    if len(tokens) < 1:
+                    # _split_command 至少返回一个元素，工具名为空即格式错误
+                    func_name, *args = tokens
+                    if not func_name:
                         res = "Error! Your command format is incorrect"
                     else:
-                        func_name = tokens[0]
-                        args = tokens[1:] if len(tokens) > 1 else []
                         
                         if self.get_stop_flag():
-                            self.execution_status = {
-                                "status": "idle",
-                                "tool_name": None,
-                                "tool_args": None,
-                                "start_time": None
-                            }
+                            self._set_execution_status("idle")
                             self.set_stop_flag(False)
                             return "**Execution stopped**\nProcessing was interrupted by user."
                         
                         # 执行函数
                         res = self.exec_func(func_name, *args)
                     
-                    print(f"[Info] AI execution result: {res}")
+                    logger.debug("AI execution result: %s", res)
                     
                     if self.get_stop_flag():
-                        self.execution_status = {
-                            "status": "idle",
-                            "tool_name": None,
-                            "tool_args": None,
-                            "start_time": None
-                        }
+                        self._set_execution_status("idle")
                         self.set_stop_flag(False)
                         return "**Execution stopped**\nProcessing was interrupted by user."
                     
@@ -1388,51 +1883,31 @@ STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
                 else:
                     # 没有命令，完成处理
                     history.append({"role": "assistant", "content": get_reply})
-                    self.execution_status = {
-                        "status": "idle",
-                        "tool_name": None,
-                        "tool_args": None,
-                        "start_time": None
-                    }
+                    self._set_execution_status("idle")
                     
                     return full_response
                     
             except Exception as e:
-                print(f"[Error] Error processing user input: {e}")
+                logger.error("Error processing user input: %s", e)
                 
                 if self.get_stop_flag():
                     self.set_stop_flag(False)
-                    self.execution_status = {
-                        "status": "idle",
-                        "tool_name": None,
-                        "tool_args": None,
-                        "start_time": None
-                    }
+                    self._set_execution_status("idle")
                     return "**Execution stopped**\nProcessing was interrupted by user."
                 
-                self.execution_status = {
-                    "status": "idle",
-                    "tool_name": None,
-                    "tool_args": None,
-                    "start_time": None
-                }
+                self._set_execution_status("idle")
                 
                 return f"Error occurred during processing: {e}"
         
         # 达到最大迭代次数
-        self.execution_status = {
-            "status": "idle",
-            "tool_name": None,
-            "tool_args": None,
-            "start_time": None
-        }
+        self._set_execution_status("idle")
         
         return f"{full_response}\n\n[Note: Reached maximum execution steps ({self.max_iterations}), task may not be fully completed]"
     
     # === 流式处理 ===
     def process_user_input_stream(self, user_input: str, conversation_history: List[Dict], callback=None):
         """流式处理用户输入 - 修复版本，支持命令执行"""
-        print(f"[AI] Starting stream processing for: {user_input[:50]}...")
+        logger.debug("Starting stream processing for: %.50s...", user_input)
         
         if self.get_stop_flag():
             self.set_stop_flag(False)
@@ -1443,21 +1918,10 @@ STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
             return
         
         # 设置处理状态
-        self.execution_status = {
-            "status": "processing",
-            "tool_name": None,
-            "tool_args": None,
-            "start_time": datetime.now().isoformat()
-        }
+        self._set_execution_status("processing", started=True)
         
-        # 创建历史副本
-        history = conversation_history.copy()
-
-        # 确保系统提示
-        if not history or history[0].get("role") != "system":
-            # 使用有效的系统提示(包含已启用的 MCP 工具)
-            effective_prompt = self.get_effective_system_prompt()
-            history.insert(0, {"role": "system", "content": effective_prompt})
+        # 创建历史副本并确保系统提示
+        history = self._copy_with_system_prompt(conversation_history)
 
         # 注意：用户消息已经在 MessageProcessor 中添加，这里不需要再添加
         # 如果 history 中最后一条已经是用户消息，说明已经被添加过了
@@ -1468,30 +1932,34 @@ STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
             # 用户消息不存在，添加用户输入
             history.append({"role": "user", "content": user_input})
 
-        # 打印简洁的prompt信息（不显示完整内容）
-        print("\n" + "="*80)
-        print("[AI] SENDING REQUEST TO API:")
-        print("="*80)
-        print(f"Messages: {len(history)} total")
-        print(f"Model: {self.model}")
-        print(f"Temperature: {self.temperature}")
-        print(f"System prompt length: {len(history[0]['content']) if history and history[0]['role'] == 'system' else 'N/A'}")
-        print(f"User messages: {sum(1 for msg in history if msg['role'] == 'user')}")
-        print(f"Assistant messages: {sum(1 for msg in history if msg['role'] == 'assistant')}")
-        print("="*80 + "\n")
+        # 记录简洁的prompt信息（不显示完整内容），统计需要遍历历史，只在 DEBUG 级别开启时计算
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Sending request to API: %s messages total, model=%s, temperature=%s, "
+                "system prompt length=%s, user messages=%s, assistant messages=%s",
+                len(history), self.model, self.temperature,
+                len(history[0]['content']) if history and history[0]['role'] == 'system' else 'N/A',
+                sum(1 for msg in history if msg['role'] == 'user'),
+                sum(1 for msg in history if msg['role'] == 'assistant'))
+
+        # 命令标记在循环中逐块、逐行使用，提前取到局部变量
+        cmd_start = self.command_start
+        cmd_line_re = _command_line_re(cmd_start)
+
+        # 流式请求参数在循环中不变，只构建一次，每轮附上当前消息
+        stream_params = {
+            "model": self.model,
+            "temperature": self.temperature,
+            "stream": True,  # 关键：启用流式
+            "max_tokens": self.max_tokens or 2048
+        }
 
         iteration = 0
-        full_response = ""
         summary_requested = False  # Flag to track if we've already requested a summary
 
         while iteration < self.max_iterations:
             if self.get_stop_flag():
-                self.execution_status = {
-                    "status": "idle",
-                    "tool_name": None,
-                    "tool_args": None,
-                    "start_time": None
-                }
+                self._set_execution_status("idle")
                 self.set_stop_flag(False)
                 if callback:
                     callback("**Execution stopped**\nProcessing was interrupted by user.")
@@ -1501,67 +1969,80 @@ STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
             
             try:
                 # 准备API参数
-                api_params = {
-                    "model": self.model,
-                    "temperature": self.temperature,
-                    "messages": history,
-                    "stream": True,  # 关键：启用流式
-                    "max_tokens": self.max_tokens or 2048
-                }
+                api_params = {**stream_params, "messages": history}
                 
-                print(f"[AI] Sending stream request with {len(history)} messages (iteration {iteration + 1})")
+                logger.debug("Sending stream request with %s messages (iteration %s)", len(history), iteration + 1)
                 
                 # 调用流式API
                 response = self.client.chat.completions.create(**api_params)
                 
-                # 处理流式响应
-                current_response = ""
-                for chunk in response:
-                    if self.get_stop_flag():
-                        break
-                    
-                    if chunk.choices and chunk.choices[0].delta.content:
-                        content = chunk.choices[0].delta.content
-                        current_response += content
-                        full_response += content
-                        
-                        # 发送内容
-                        if callback:
-                            callback(content)
-                        else:
-                            yield content
-                
-                print(f"[AI] Stream iteration {iteration + 1} complete: {current_response[:100]}...")
+                # 处理流式响应（分片收集，流结束后一次性拼接）
+                current_parts = []
+                scanner = _CommandScanner(cmd_start)
+
+                # callback 通常跨线程（Qt 信号等），按字数/时间窗口合并后再发送
+                buffer = _CallbackBuffer(cmd_start)
+                try:
+                    for chunk_ix, chunk in enumerate(response):
+                        if chunk_ix % _STOP_POLL_CHUNKS == 0 and self.get_stop_flag():
+                            break
+
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            content = chunk.choices[0].delta.content
+                            current_parts.append(content)
+
+                            # 边接收边检测命令标记，普通回复结束后无需再逐行扫描
+                            # 本方法会执行回复中的每一条命令，因此不提前结束流
+                            if not scanner.seen:
+                                scanner.feed(content)
+
+                            # 发送内容
+                            if callback:
+                                text = buffer.add(content, scanner.offset)
+                                if text:
+                                    callback(text)
+                            else:
+                                yield content
+                finally:
+                    # 流结束（或中断）时发送剩余内容
+                    rest = buffer.drain()
+                    if rest:
+                        callback(rest)
+
+                current_response = "".join(current_parts)
+                logger.debug("Stream iteration %s complete: %.100s...", iteration + 1, current_response)
                 
                 # 检查是否AI想要执行命令
                 # 检查响应中是否包含任何命令（可能在多行中）
-                lines = current_response.split('\n')
-                command_lines = [line.strip() for line in lines if line.strip().startswith(self.command_start)]
+                if scanner.seen:
+                    # 一次正则扫描找出所有以命令标记开头的行（不拆分整段回复）
+                    command_lines = [m.group(1).strip() for m in cmd_line_re.finditer(current_response)]
+                else:
+                    command_lines = []
 
                 if command_lines:
-                    print(f"[AI] {len(command_lines)} command(s) detected in response")
+                    logger.debug("%s command(s) detected in response", len(command_lines))
 
                     # 为每个命令执行
                     for cmd_idx, command_line in enumerate(command_lines):
-                        print(f"[AI] Processing command {cmd_idx + 1}/{len(command_lines)}: {command_line}")
+                        logger.debug("Processing command %s/%s: %s", cmd_idx + 1, len(command_lines), command_line)
 
                         # 添加当前命令到历史
                         history.append({"role": "assistant", "content": command_line})
 
                         # 解析命令
-                        tokens = command_line.replace(self.command_start, "").strip().split(self.command_separator)
-                        tokens = [t.strip() for t in tokens]
+                        tokens = self._split_command(command_line)
 
-                        if len(tokens) < 1:
+                        # _split_command 至少返回一个元素，工具名为空即格式错误
+                        func_name, *args = tokens
+                        if not func_name:
                             res = "Error! Your command format is incorrect"
                         else:
-                            func_name = tokens[0]
-                            args = tokens[1:] if len(tokens) > 1 else []
 
                             # 执行函数
                             res = self.exec_func(func_name, *args)
 
-                        print(f"[AI] Command {cmd_idx + 1} execution result: {res[:200] if len(res) > 200 else res}")
+                        logger.debug("Command %s execution result: %.200s", cmd_idx + 1, res)
 
                         # 发送命令执行结果到UI（通过callback）
                         if callback and "Execution successful:" in res:
@@ -1570,7 +2051,7 @@ STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
                             # 限制显示长度为100字
                             display_result = actual_result[:100] + "..." if len(actual_result) > 100 else actual_result
                             result_message = f"Execution successful:\n{display_result}"
-                            print(f"[AI] >>>>> SENDING COMMAND RESULT VIA CALLBACK: {result_message[:100]}...")
+                            logger.debug("Sending command result via callback: %.100s...", result_message)
                             callback(result_message)
 
                         # 添加执行结果到历史（使用自定义提示词）
@@ -1581,7 +2062,7 @@ STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
 
                         # 检查是否执行失败
                         if ("Execution failed" in res or "Error" in res or "error:" in res.lower()):
-                            print(f"[AI] Command {cmd_idx + 1} failed, stopping further command execution")
+                            logger.debug("Command %s failed, stopping further command execution", cmd_idx + 1)
                             # 显示错误信息并让 AI 重新尝试
                             error_prompt = f"**错误**: {res}\n\n" + self.command_retry_prompt.format(error=res)
                             history.append({
@@ -1593,7 +2074,7 @@ STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
 
                         # 如果执行成功但还有更多命令，继续处理
                         if cmd_idx < len(command_lines) - 1:
-                            print(f"[AI] Command {cmd_idx + 1} succeeded, processing next command")
+                            logger.debug("Command %s succeeded, processing next command", cmd_idx + 1)
                             continue
 
                     # 所有命令处理完成（或遇到错误后跳出）
@@ -1604,14 +2085,14 @@ STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
 
                     if ("Execution failed" in last_result or "Error" in last_result or "error:" in last_result.lower()):
                         # 最后一个命令失败，让 AI 重试
-                        print("[AI] Last command failed, AI will retry")
+                        logger.debug("Last command failed, AI will retry")
                         continue
 
                     # 如果所有命令都成功，让 AI 决定下一步
                     if "Execution successful" in last_result or "Tool execution completed" in last_result:
-                        print("[AI] All commands executed successfully, AI will decide next step")
+                        logger.debug("All commands executed successfully, AI will decide next step")
                         if iteration >= self.max_iterations:
-                            print(f"[AI] Reached safety limit ({self.max_iterations}), requesting final summary")
+                            logger.debug("Reached safety limit (%s), requesting final summary", self.max_iterations)
                             history.append({
                                 "role": "user",
                                 "content": self.final_summary_prompt
@@ -1631,20 +2112,17 @@ STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
                         # 判断标准：响应长度足够（>100字符）且包含常见的总结性词汇
                         is_complete_answer = (
                             len(current_response) > 100 and
-                            any(keyword in current_response for keyword in [
-                                '您的', '包含', '总结', '综上', '因此', '文件', '文件夹',
-                                'your', 'contains', 'summary', 'conclusion', 'files', 'folders'
-                            ])
+                            _SUMMARY_KEYWORDS_RE.search(current_response) is not None
                         )
 
                         if is_complete_answer:
                             # AI已经给出了完整的答案，不需要再请求总结
-                            print("[AI] AI provided complete answer, no need to request summary")
-                            print(f"[AI] Answer length: {len(current_response)}, preview: {current_response[:100]}...")
+                            logger.debug("AI provided complete answer, no need to request summary")
+                            logger.debug("Answer length: %d, preview: %.100s...", len(current_response), current_response)
                             break
                         else:
                             # AI的响应不够完整，请求总结
-                            print("[AI] Requesting final summary...")
+                            logger.debug("Requesting final summary...")
                             history.append({
                                 "role": "user",
                                 "content": self.final_summary_prompt
@@ -1656,49 +2134,15 @@ STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
                     else:
                         # 已经请求过总结，或没有执行过命令，直接结束
                         if summary_requested:
-                            print("[AI] Summary provided, completing task")
+                            logger.debug("Summary provided, completing task")
                         break
                         
             except Exception as e:
-                import traceback
-                print(f"[AI] Stream API error: {e}")
-                print(f"[AI] Error type: {type(e).__name__}")
-                print(f"[AI] Traceback:\n{traceback.format_exc()}")
+                # 堆栈由 logging 在真正输出时才格式化
+                logger.exception("Stream API error (%s): %s", type(e).__name__, e)
 
                 # Provide more helpful error message
-                error_msg = f"❌ **Connection Error**\n\n"
-                error_msg += f"**Error Details:**\n"
-                error_msg += f"- Type: {type(e).__name__}\n"
-                error_msg += f"- Message: {str(e)}\n\n"
-
-                # Check for common issues
-                error_str = str(e).lower()
-                if 'connection' in error_str or 'network' in error_str:
-                    error_msg += f"**Possible Causes:**\n"
-                    error_msg += f"- Network connection issue\n"
-                    error_msg += f"- API server is down or unreachable\n"
-                    error_msg += f"- Firewall or proxy blocking the connection\n"
-                    error_msg += f"- Incorrect API base URL\n\n"
-                    error_msg += f"**Suggestions:**\n"
-                    error_msg += f"- Check your internet connection\n"
-                    error_msg += f"- Verify API base URL: `{self.api_base}`\n"
-                    error_msg += f"- Try again later\n"
-                elif 'timeout' in error_str:
-                    error_msg += f"**Request timed out.**\n\n"
-                    error_msg += f"**Suggestions:**\n"
-                    error_msg += f"- Check your network speed\n"
-                    error_msg += f"- The API server might be overloaded\n"
-                    error_msg += f"- Try again later\n"
-                elif 'authentication' in error_str or '401' in error_str:
-                    error_msg += f"**Authentication failed.**\n\n"
-                    error_msg += f"**Suggestions:**\n"
-                    error_msg += f"- Check your API key\n"
-                    error_msg += f"- Verify your API key is valid\n"
-                elif 'rate' in error_str or '429' in error_str:
-                    error_msg += f"**Rate limit exceeded.**\n\n"
-                    error_msg += f"**Suggestions:**\n"
-                    error_msg += f"- Wait a moment and try again\n"
-                    error_msg += f"- Check your API usage limits\n"
+                error_msg = _format_stream_error(e, self.api_base)
 
                 if callback:
                     callback(error_msg)
@@ -1707,29 +2151,78 @@ STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
                 break
         
         # 重置状态
-        self.execution_status = {
-            "status": "idle",
-            "tool_name": None,
-            "tool_args": None,
-            "start_time": None
-        }
+        self._set_execution_status("idle")
 
         # CRITICAL: 将处理后的历史保存回 self.conv_his
-        # 这样下次对话时才能记住上下文
-        self.conv_his = history.copy()
-        print(f"[AI] Updated conv_his with {len(self.conv_his)} messages")
+        # 这样下次对话时才能记住上下文（history 在入口处已是副本，直接接管即可）
+        self.conv_his = history
+        logger.debug("Updated conv_his with %s messages", len(self.conv_his))
 
         # CRITICAL: 确保生成器正确结束
-        # 发送结束标记并明确完成生成器
-        print("[AI] Stream processing completing, sending final empty chunk")
-
-        # 生成器结束前的日志（在yield之前执行，避免线程问题）
-        print("[AI] Generator completing, sending final empty chunk")
+        # 发送结束标记并明确完成生成器（日志在yield之前执行，避免线程问题）
+        logger.debug("Stream processing completing, sending final empty chunk")
 
         # 最后一次yield，确保生成器结束
         yield ""
 
 
+    def _consume_stop_flag(self) -> bool:
+        """已请求停止时重置执行状态和停止标志并返回 True"""
+        if not self.get_stop_flag():
+            return False
+        self._set_execution_status("idle")
+        self.set_stop_flag(False)
+        return True
+
+    def _begin_inp_turn(self, user_input: str, history: List[Dict]) -> bool:
+        """process_user_inp 流式处理的开头：设置执行状态并把用户输入加入历史，已请求停止时返回 False"""
+        if self._consume_stop_flag():
+            return False
+        self._set_execution_status("processing", started=True)
+        history.append({"role": "user", "content": user_input})
+        return True
+
+    def _parse_inp_command(self, full_reply: str, offset: int, iteration: int):
+        """解析流式回复中 offset 处的命令行，返回 (func_name, args)，格式错误时 func_name 为空
+
+        回复以命令标记开头时解析完整回复，参数可以跨行（如写入文件的文本）；
+        标记出现在回复中间时只解析命令所在的一行（该行结束后已停止接收）
+        """
+        logger.debug("[Iteration %s] AI requested execution: %s", iteration + 1, full_reply)
+        # _split_command 至少返回一个元素
+        func_name, *args = self._split_command(full_reply[offset:], first_line_only=offset > 0)
+        return func_name, args
+
+    def _record_inp_command_result(self, history: List[Dict], full_reply: str, res: str) -> str:
+        """把回复和执行结果加入对话历史，返回发送给调用方的结果消息"""
+        logger.debug("AI execution result: %s", res)
+        if "Execution successful" in res:
+            logger.debug("Command executed successfully, continuing to next iteration")
+        else:
+            # 如果执行失败，AI应该重新尝试
+            logger.debug("Command execution failed, AI should retry")
+
+        history.append({"role": "assistant", "content": full_reply})
+        history.append({
+            "role": "user",
+            "content": f"Execution result: {res}\nPlease decide the next operation based on this result. If the task is complete, please summarize and tell me the result."
+        })
+
+        # 流式命令执行结果
+        return f"\n\n**Command Execution Result**\n```\n{res}\n```"
+
+    def _inp_error_message(self, e: Exception) -> str:
+        """处理过程中出错时重置状态，返回发送给调用方的消息（由停止导致时返回停止提示）"""
+        logger.error("Error processing user input: %s", e)
+
+        # 检查是否是stop导致的错误
+        if self._consume_stop_flag():
+            return "**Execution stopped**\nProcessing was interrupted by user."
+
+        # 重置执行状态
+        self._set_execution_status("idle")
+        return f"Error occurred during processing: {e}"
+
     def _process_user_inp_stream_internal(self, user_input: str, history: List[Dict], callback=None):
         """内部流式处理方法 - 保持原始逻辑"""
         if not user_input:
@@ -1738,226 +2231,258 @@ STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
 
         max_iter = self.max_iterations
         
-        # 检查停止标志
-        if self.get_stop_flag():
-            self.set_stop_flag(False)
-            self.execution_status = {
-                "status": "idle",
-                "tool_name": None,
-                "tool_args": None,
-                "start_time": None
-            }
+        # 检查停止标志，设置执行状态并添加用户输入
+        if not self._begin_inp_turn(user_input, history):
             yield "**Execution stopped**\nProcessing was interrupted by user."
             return
         
-        # 设置执行状态
-        self.execution_status = {
-            "status": "processing",
-            "tool_name": None,
-            "tool_args": None,
-            "start_time": datetime.now().isoformat()
-        }
-        
+        # 命令标记在循环中逐块使用，提前取到局部变量
+        cmd_start = self.command_start
+
         iteration = 0
         while iteration < max_iter:
             # 检查停止标志
-            if self.get_stop_flag():
-                print(f"[Info] Stop flag detected, stopping execution at iteration {iteration}")
-                self.execution_status = {
-                    "status": "idle",
-                    "tool_name": None,
-                    "tool_args": None,
-                    "start_time": None
-                }
-                self.set_stop_flag(False)
+            if self._consume_stop_flag():
+                logger.info("Stop flag detected, stopping execution at iteration %s", iteration)
                 yield "**Execution stopped**\nProcessing was interrupted by user."
                 return
             
             try:
                 # 准备API参数
                 api_params = {
-                    "model": self.model,
-                    "temperature": self.temperature,
+                    **self._base_api_params(),
                     "messages": history,
                     "stream": True
                 }
                 
-                # 添加可选参数
-                optional_params = {
-                    "max_tokens": self.max_tokens,
-                    "top_p": self.top_p,
-                    "stop": self.stop,
-                    "presence_penalty": self.presence_penalty,
-                    "frequency_penalty": self.frequency_penalty
-                }
-                
-                for param, value in optional_params.items():
-                    if value is not None:
-                        api_params[param] = value
-                
-                print(f"[Debug] Sending stream request to API with {len(history)} messages (iteration {iteration + 1})")
+                logger.debug("Sending stream request to API with %s messages (iteration %s)", len(history), iteration + 1)
                 
                 # 执行流式API调用
                 response = self.client.chat.completions.create(**api_params)
                 
                 # 收集响应
-                collected_chunks = []
                 collected_messages = []
+
+                # 增量检测命令：只执行第一条命令行，命令行完整后即可结束流
+                scanner = _CommandScanner(cmd_start)
+                buffer = _CallbackBuffer(cmd_start)
                 
                 # 处理流式响应
-                for chunk in response:
-                    # 检查停止标志
-                    if self.get_stop_flag():
-                        self.execution_status = {
-                            "status": "idle",
-                            "tool_name": None,
-                            "tool_args": None,
-                            "start_time": None
-                        }
-                        self.set_stop_flag(False)
-                        yield "**Execution stopped**\nProcessing was interrupted by user."
-                        return
-                    
-                    if chunk.choices[0].delta.content is not None:
-                        content = chunk.choices[0].delta.content
-                        collected_chunks.append(chunk)
-                        collected_messages.append(content)
+                try:
+                    for chunk_ix, chunk in enumerate(response):
+                        # 检查停止标志（每 _STOP_POLL_CHUNKS 块一次）
+                        if chunk_ix % _STOP_POLL_CHUNKS == 0 and self._consume_stop_flag():
+                            yield "**Execution stopped**\nProcessing was interrupted by user."
+                            return
                         
-                        # 发送实时内容
-                        if callback:
-                            callback(content)
-                        else:
-                            yield content
+                        if chunk.choices[0].delta.content is not None:
+                            content = chunk.choices[0].delta.content
+                            collected_messages.append(content)
+                            
+                            line_done = scanner.feed(content)
+
+                            # 发送实时内容（回调按阈值合并发送）
+                            if callback:
+                                text = buffer.add(content, scanner.offset)
+                                if text:
+                                    callback(text)
+                            else:
+                                yield content
+
+                            # 命令行已结束，后续生成的内容不会被使用，关闭连接停止生成
+                            # （回复以命令标记开头时参数可以跨行，需要接收完整回复）
+                            if line_done and scanner.offset > 0:
+                                logger.debug("Command line complete, closing stream early (iteration %s)", iteration + 1)
+                                response.close()
+                                break
+                finally:
+                    # 流结束（或中断）时发送剩余内容
+                    rest = buffer.drain()
+                    if rest:
+                        callback(rest)
                 
                 # 合并收集的消息
                 full_reply = ''.join(collected_messages)
-                print(f"[Debug] Full reply received (iteration {iteration + 1}): {full_reply[:100]}..." if len(full_reply) > 100 else f"[Debug] Full reply received: {full_reply}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Full reply received (iteration %s): %s", iteration + 1, _truncate(full_reply))
                 
-                # 检查是否AI想要执行命令
-                if self.command_start in full_reply:
-                    print(f"\n[Iteration {iteration + 1}][AI requested execution] {full_reply}")
-                    
-                    # 提取命令部分
-                    if full_reply.startswith(self.command_start):
-                        command_line = full_reply
-                    else:
-                        # 从回复中提取命令
-                        start_idx = full_reply.find(self.command_start)
-                        command_line = full_reply[start_idx:].split('\n')[0].strip()
-                    
-                    # 解析命令
-                    command_text = command_line.replace(self.command_start, "").strip()
-                    tokens = command_text.split(self.command_separator)
-                    tokens = [t.strip() for t in tokens]
-                    
-                    if len(tokens) < 1:
+                # 检查是否AI想要执行命令（流式接收时已定位命令标记，无需再扫描完整回复）
+                if scanner.seen:
+                    func_name, args = self._parse_inp_command(full_reply, scanner.offset, iteration)
+                    if not func_name:
                         res = "Error! Your command format is incorrect"
+                    elif self._consume_stop_flag():
+                        yield "**Execution stopped**\nProcessing was interrupted by user."
+                        return
                     else:
-                        func_name = tokens[0]
-                        args = tokens[1:] if len(tokens) > 1 else []
-                        
-                        # 检查停止标志
-                        if self.get_stop_flag():
-                            self.execution_status = {
-                                "status": "idle",
-                                "tool_name": None,
-                                "tool_args": None,
-                                "start_time": None
-                            }
-                            self.set_stop_flag(False)
-                            yield "**Execution stopped**\nProcessing was interrupted by user."
-                            return
-                        
                         # 执行函数
                         res = self.exec_func(func_name, *args)
                     
-                    print(f"[Info] AI execution result: {res}")
-                    
                     # 检查停止标志
-                    if self.get_stop_flag():
-                        self.execution_status = {
-                            "status": "idle",
-                            "tool_name": None,
-                            "tool_args": None,
-                            "start_time": None
-                        }
-                        self.set_stop_flag(False)
+                    if self._consume_stop_flag():
                         yield "**Execution stopped**\nProcessing was interrupted by user."
                         return
                     
-                    # 添加回复和结果到对话历史
-                    history.append({"role": "assistant", "content": full_reply})
-                    history.append({
-                        "role": "user", 
-                        "content": f"Execution result: {res}\nPlease decide the next operation based on this result. If the task is complete, please summarize and tell me the result."
-                    })
-                    
-                    # 流式命令执行结果
-                    result_message = f"\n\n**Command Execution Result**\n```\n{res}\n```"
-                    
-                    # 发送结果
+                    # 添加回复和结果到对话历史，发送结果
+                    result_message = self._record_inp_command_result(history, full_reply, res)
                     if callback:
                         callback(result_message)
                     else:
                         yield result_message
                     
+                    # 无论成功与否都进入下一轮，失败时由 AI 重新尝试
                     iteration += 1
-                    
-                    # 如果执行成功，继续下一个迭代
-                    if "Execution successful" in res:
-                        print(f"[Info] Command executed successfully, continuing to next iteration")
-                        continue
-                    else:
-                        # 如果执行失败，AI应该重新尝试
-                        print(f"[Info] Command execution failed, AI should retry")
-                        continue
+                    continue
                     
                 else:
                     # 没有命令执行，完成处理
                     history.append({"role": "assistant", "content": full_reply})
-                    self.execution_status = {
-                        "status": "idle",
-                        "tool_name": None,
-                        "tool_args": None,
-                        "start_time": None
-                    }
+                    self._set_execution_status("idle")
                     return
                     
             except Exception as e:
-                print(f"[Error] Error processing user input: {e}")
-                
-                # 检查是否是stop导致的错误
-                if self.get_stop_flag():
-                    self.set_stop_flag(False)
-                    self.execution_status = {
-                        "status": "idle",
-                        "tool_name": None,
-                        "tool_args": None,
-                        "start_time": None
-                    }
-                    yield "**Execution stopped**\nProcessing was interrupted by user."
-                    return
-                
-                # 重置执行状态
-                self.execution_status = {
-                    "status": "idle",
-                    "tool_name": None,
-                    "tool_args": None,
-                    "start_time": None
-                }
-                
-                yield f"Error occurred during processing: {e}"
+                yield self._inp_error_message(e)
                 return
         
         # 达到最大迭代次数
-        self.execution_status = {
-            "status": "idle",
-            "tool_name": None,
-            "tool_args": None,
-            "start_time": None
-        }
+        self._set_execution_status("idle")
         
         yield f"Reached maximum execution steps ({max_iter}), task may not be fully completed"
+
+    async def _aprocess_user_inp_stream_internal(self, user_input: str, history: List[Dict], callback=None):
+        """_process_user_inp_stream_internal 的异步版本（AsyncOpenAI + async for）
+
+        供运行在事件循环中的调用方使用，逐块内容无需跨线程转发；
+        callback 可以是普通函数或协程函数。工具函数是同步的，放到线程池中执行
+        """
+        if not user_input:
+            yield ""
+            return
+
+        max_iter = self.max_iterations
+
+        # 检查停止标志，设置执行状态并添加用户输入
+        if not self._begin_inp_turn(user_input, history):
+            yield "**Execution stopped**\nProcessing was interrupted by user."
+            return
+
+        cmd_start = self.command_start
+        callback_is_async = asyncio.iscoroutinefunction(callback)
+
+        async def emit(text):
+            if callback_is_async:
+                await callback(text)
+            else:
+                callback(text)
+
+        iteration = 0
+        while iteration < max_iter:
+            # 检查停止标志
+            if self._consume_stop_flag():
+                logger.info("Stop flag detected, stopping execution at iteration %s", iteration)
+                yield "**Execution stopped**\nProcessing was interrupted by user."
+                return
+
+            try:
+                # 准备API参数
+                api_params = {
+                    **self._base_api_params(),
+                    "messages": history,
+                    "stream": True
+                }
+
+                logger.debug("Sending async stream request to API with %s messages (iteration %s)", len(history), iteration + 1)
+
+                # 执行流式API调用
+                response = await self._get_async_client().chat.completions.create(**api_params)
+
+                # 收集响应，增量检测命令：只执行第一条命令行，命令行完整后即可结束流
+                collected_messages = []
+                scanner = _CommandScanner(cmd_start)
+                buffer = _CallbackBuffer(cmd_start)
+
+                # 处理流式响应
+                chunk_ix = 0
+                try:
+                    async for chunk in response:
+                        # 检查停止标志（每 _STOP_POLL_CHUNKS 块一次）
+                        if chunk_ix % _STOP_POLL_CHUNKS == 0 and self._consume_stop_flag():
+                            yield "**Execution stopped**\nProcessing was interrupted by user."
+                            return
+                        chunk_ix += 1
+
+                        if chunk.choices[0].delta.content is not None:
+                            content = chunk.choices[0].delta.content
+                            collected_messages.append(content)
+
+                            line_done = scanner.feed(content)
+
+                            # 发送实时内容（回调按阈值合并发送）
+                            if callback:
+                                text = buffer.add(content, scanner.offset)
+                                if text:
+                                    await emit(text)
+                            else:
+                                yield content
+
+                            # 命令行已结束，后续生成的内容不会被使用，关闭连接停止生成
+                            # （回复以命令标记开头时参数可以跨行，需要接收完整回复）
+                            if line_done and scanner.offset > 0:
+                                logger.debug("Command line complete, closing stream early (iteration %s)", iteration + 1)
+                                await response.close()
+                                break
+                finally:
+                    # 流结束（或中断）时发送剩余内容
+                    rest = buffer.drain()
+                    if rest:
+                        await emit(rest)
+
+                # 合并收集的消息
+                full_reply = ''.join(collected_messages)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Full reply received (iteration %s): %s", iteration + 1, _truncate(full_reply))
+
+                # 检查是否AI想要执行命令
+                if scanner.seen:
+                    func_name, args = self._parse_inp_command(full_reply, scanner.offset, iteration)
+                    if not func_name:
+                        res = "Error! Your command format is incorrect"
+                    elif self._consume_stop_flag():
+                        yield "**Execution stopped**\nProcessing was interrupted by user."
+                        return
+                    else:
+                        # 执行函数（同步工具放到线程中，不阻塞事件循环）
+                        res = await asyncio.to_thread(self.exec_func, func_name, *args)
+
+                    # 检查停止标志
+                    if self._consume_stop_flag():
+                        yield "**Execution stopped**\nProcessing was interrupted by user."
+                        return
+
+                    # 添加回复和结果到对话历史，发送结果
+                    result_message = self._record_inp_command_result(history, full_reply, res)
+                    if callback:
+                        await emit(result_message)
+                    else:
+                        yield result_message
+
+                    iteration += 1
+                    continue
+
+                else:
+                    # 没有命令执行，完成处理
+                    history.append({"role": "assistant", "content": full_reply})
+                    self._set_execution_status("idle")
+                    return
+
+            except Exception as e:
+                yield self._inp_error_message(e)
+                return
+
+        # 达到最大迭代次数
+        self._set_execution_status("idle")
+
+        yield f"Reached maximum execution steps ({max_iter}), task may not be fully completed"
     
     # === 兼容性方法 ===
     
@@ -1970,6 +2495,10 @@ STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
             # 非流式处理 - 返回元组
             return self._process_user_inp_non_stream(user_inp, max_iter)
     
+    def aprocess_user_inp(self, user_inp, callback=None):
+        """process_user_inp 的异步流式版本 - 返回异步生成器（在事件循环中使用）"""
+        return self._aprocess_user_inp_stream_internal(user_inp, self.conv_his, callback)
+
     def _process_user_inp_non_stream(self, user_inp, max_iter=None):
         """非流式处理用户输入 - 保持原始逻辑"""
         if not user_inp:
@@ -1980,104 +2509,61 @@ STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
         # 检查停止标志
         if self.get_stop_flag():
             self.set_stop_flag(False)
-            self.execution_status = {
-                "status": "idle",
-                "tool_name": None,
-                "tool_args": None,
-                "start_time": None
-            }
+            self._set_execution_status("idle")
             return "**Execution stopped**\nProcessing was interrupted by user.", True
         
-        self.execution_status = {
-            "status": "processing",
-            "tool_name": None,
-            "tool_args": None,
-            "start_time": datetime.now().isoformat()
-        }
+        self._set_execution_status("processing", started=True)
         
         self.conv_his.append({"role": "user", "content": user_inp})
         
         for step in range(max_iter):
             if self.get_stop_flag():
-                print(f"[Info] Stop flag detected, stopping execution at step {step+1}")
-                self.execution_status = {
-                    "status": "idle",
-                    "tool_name": None,
-                    "tool_args": None,
-                    "start_time": None
-                }
+                logger.info("Stop flag detected, stopping execution at step %s", step + 1)
+                self._set_execution_status("idle")
                 self.set_stop_flag(False)
                 return "**Execution stopped**\nProcessing was interrupted by user.", True
             
             try:
                 api_params = {
-                    "model": self.model,
-                    "temperature": self.temperature,
+                    **self._base_api_params(),
                     "messages": self.conv_his,
                     "stream": False  # 非流式
                 }
                 
-                optional_params = {
-                    "max_tokens": self.max_tokens,
-                    "top_p": self.top_p,
-                    "stop": self.stop,
-                    "presence_penalty": self.presence_penalty,
-                    "frequency_penalty": self.frequency_penalty
-                }
-                
-                for param, value in optional_params.items():
-                    if value is not None:
-                        api_params[param] = value
-                
-                print(f"[Debug] Sending non-stream request to API with {len(self.conv_his)} messages")
+                logger.debug("Sending non-stream request to API with %s messages", len(self.conv_his))
                 
                 response = self.client.chat.completions.create(**api_params)
                 get_reply = response.choices[0].message.content
-                print(f"[Debug] Received reply: {get_reply[:100]}..." if len(get_reply) > 100 else f"[Debug] Received reply: {get_reply}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Received reply: %s", _truncate(get_reply))
                 
                 if self.get_stop_flag():
-                    self.execution_status = {
-                        "status": "idle",
-                        "tool_name": None,
-                        "tool_args": None,
-                        "start_time": None
-                    }
+                    self._set_execution_status("idle")
                     self.set_stop_flag(False)
                     return "**Execution stopped**\nProcessing was interrupted by user.", True
                 
                 if get_reply.startswith(self.command_start):
-                    print(f"\n[Step {step + 1}][AI requested execution] {get_reply}")
+                    logger.debug("[Step %s] AI requested execution: %s", step + 1, get_reply)
                     
-                    tokens = get_reply.replace(self.command_start, "").strip().split(self.command_separator)
-                    tokens = [t.strip() for t in tokens]
+                    tokens = self._split_command(get_reply)
                     
-                    if len(tokens) < 1:
+                    # _split_command 至少返回一个元素，工具名为空即格式错误
+                    func_name, *args = tokens
+                    if not func_name:
                         res = "Error! Your command format is incorrect"
                     else:
-                        func_name = tokens[0]
-                        args = tokens[1:] if len(tokens) > 1 else []
                         
                         if self.get_stop_flag():
-                            self.execution_status = {
-                                "status": "idle",
-                                "tool_name": None,
-                                "tool_args": None,
-                                "start_time": None
-                            }
+                            self._set_execution_status("idle")
                             self.set_stop_flag(False)
                             return "**Execution stopped**\nProcessing was interrupted by user.", True
                         
                         res = self.exec_func(func_name, *args)
                     
-                    print(f"[Info] AI execution result: {res}")
+                    logger.debug("AI execution result: %s", res)
                     
                     if self.get_stop_flag():
-                        self.execution_status = {
-                            "status": "idle",
-                            "tool_name": None,
-                            "tool_args": None,
-                            "start_time": None
-                        }
+                        self._set_execution_status("idle")
                         self.set_stop_flag(False)
                         return "**Execution stopped**\nProcessing was interrupted by user.", True
                     
@@ -2090,43 +2576,23 @@ STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
                 else:
                     self.conv_his.append({"role": "assistant", "content": get_reply})
                     
-                    self.execution_status = {
-                        "status": "idle",
-                        "tool_name": None,
-                        "tool_args": None,
-                        "start_time": None
-                    }
+                    self._set_execution_status("idle")
                     
                     return get_reply, True
                     
             except Exception as e:
-                print(f"[Error] Error processing user input: {e}")
+                logger.error("Error processing user input: %s", e)
                 
                 if self.get_stop_flag():
                     self.set_stop_flag(False)
-                    self.execution_status = {
-                        "status": "idle",
-                        "tool_name": None,
-                        "tool_args": None,
-                        "start_time": None
-                    }
+                    self._set_execution_status("idle")
                     return "**Execution stopped**\nProcessing was interrupted by user.", True
                 
-                self.execution_status = {
-                    "status": "idle",
-                    "tool_name": None,
-                    "tool_args": None,
-                    "start_time": None
-                }
+                self._set_execution_status("idle")
                 
                 return f"Error occurred during processing: {e}", True
         
-        self.execution_status = {
-            "status": "idle",
-            "tool_name": None,
-            "tool_args": None,
-            "start_time": None
-        }
+        self._set_execution_status("idle")
         
         return f"Reached maximum execution steps ({max_iter}), task may not be fully completed", False
     
@@ -2137,25 +2603,23 @@ STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
         # 使用有效的系统提示(包含已启用的 MCP 工具)
         effective_prompt = self.get_effective_system_prompt()
         self.conv_his = [{"role": "system", "content": effective_prompt}]
-        print("[AI] Conversation history reset")
+        logger.debug("Conversation history reset")
     
     def load_conversation_history(self, history_messages: List[Dict]):
         """加载对话历史到AI上下文"""
-        print(f"[AI] Loading {len(history_messages)} conversation history messages")
+        logger.debug("Loading %s conversation history messages", len(history_messages))
         
         # 重置对话
         self.reset_conversation()
         
-        # 添加历史消息到对话
-        for msg in history_messages:
-            role = "user" if msg.get("is_sender", False) else "assistant"
-            content = msg.get("text", "")
-            
-            # 跳过空消息
-            if content and content.strip():
-                self.conv_his.append({"role": role, "content": content})
+        # 添加历史消息到对话（跳过空消息），一次性扩展列表
+        self.conv_his.extend([
+            {"role": "user" if msg.get("is_sender", False) else "assistant", "content": content}
+            for msg in history_messages
+            if (content := msg.get("text", "")) and content.strip()
+        ])
         
-        print(f"[AI] Conversation history loaded. Total messages: {len(self.conv_his)}")
+        logger.debug("Conversation history loaded. Total messages: %s", len(self.conv_his))
     
     def get_current_history(self) -> List[Dict]:
         """获取当前对话历史"""
@@ -2164,7 +2628,7 @@ STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
     def set_current_history(self, history: List[Dict]):
         """设置当前对话历史"""
         self.conv_his = history.copy()
-        print(f"[AI] History set with {len(self.conv_his)} messages")
+        logger.debug("History set with %s messages", len(self.conv_his))
     
     # === 配置方法 ===
     
@@ -2173,17 +2637,18 @@ STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
         self.user_system_prompt = new_prompt
         # 生成完整的有效提示词（包含工具描述和 Markdown 规范）
         effective_prompt = self.get_effective_system_prompt()
-        # 更新对话历史中的系统提示
-        for i, msg in enumerate(self.conv_his):
+        # 更新对话历史中的系统提示（内容未变时保持原样，不影响服务端前缀缓存）
+        for msg in self.conv_his:
             if msg.get("role") == "system":
-                self.conv_his[i]["content"] = effective_prompt
+                if msg.get("content") != effective_prompt:
+                    msg["content"] = effective_prompt
                 break
         else:
             self.conv_his.insert(0, {"role": "system", "content": effective_prompt})
     
     def update_config(self, config_dict: Dict):
         """从字典更新配置，不创建新实例"""
-        print(f"[AI] Updating AI configuration for existing instance")
+        logger.debug("Updating AI configuration for existing instance")
 
         # 更新API配置
         # api_key 不再从这里更新，而是始终从 .confignore 文件读取
@@ -2216,7 +2681,7 @@ STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
         
         if 'stream' in config_dict:
             self.stream = config_dict['stream']
-            print(f"[AI] Stream mode updated to: {self.stream}")
+            logger.debug("Stream mode updated to: %s", self.stream)
         
         if 'presence_penalty' in config_dict:
             self.presence_penalty = config_dict['presence_penalty']
@@ -2227,9 +2692,11 @@ STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
         # 更新命令配置
         if 'command_start' in config_dict:
             self.command_start = config_dict['command_start']
+            self._invalidate_tool_caches()
         
         if 'command_separator' in config_dict:
             self.command_separator = config_dict['command_separator']
+            self._invalidate_tool_caches()
         
         if 'max_iterations' in config_dict:
             self.max_iterations = config_dict['max_iterations']
@@ -2242,25 +2709,25 @@ STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
         # 更新MCP路径并重新加载工具
         if 'mcp_paths' in config_dict:
             new_paths = config_dict['mcp_paths']
-            print(f"[AI] MCP paths changed, reloading tools")
-            print(f"[Debug] New paths: {new_paths}")
-            print(f"[Debug] Old paths: {self.mcp_paths}")
+            logger.info("MCP paths changed, reloading tools")
+            logger.debug("New paths: %s", new_paths)
+            logger.debug("Old paths: %s", self.mcp_paths)
 
             if set(new_paths) != set(self.mcp_paths):
                 self.mcp_paths = new_paths
                 # 实际加载 MCP 工具（不再跳过）
-                print("[AI] Calling _load_mcp_from_paths...")
+                logger.debug("Calling _load_mcp_from_paths...")
                 self._load_mcp_from_paths()
-                print(f"[Debug] Loaded {len(self.mcp_tools_desc)} tool descriptions")
+                logger.debug("Loaded %s tool descriptions", len(self.mcp_tools_desc))
                 # 保留现有的 enabled_mcp_tools 设置，或者启用所有新工具
                 if self.enabled_mcp_tools:
-                    self.enabled_mcp_tools = self.enabled_mcp_tools.intersection(set(self.mcp_tools_desc.keys()))
+                    self.enabled_mcp_tools &= self.mcp_tools_desc.keys()
                 elif self.mcp_tools_desc:
                     # 如果没有启用任何工具，默认启用所有
                     self.enabled_mcp_tools = set(self.mcp_tools_desc.keys())
-                print(f"[Info] MCP tools reloaded, {len(self.enabled_mcp_tools)} tools enabled")
+                logger.info("MCP tools reloaded, %s tools enabled", len(self.enabled_mcp_tools))
             else:
-                print("[AI] MCP paths unchanged, skipping reload")
+                logger.debug("MCP paths unchanged, skipping reload")
 
         # 更新自定义提示词
         if 'command_execution_prompt' in config_dict and config_dict['command_execution_prompt']:
@@ -2276,9 +2743,9 @@ STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
         if 'enabled_mcp_tools' in config_dict:
             enabled_tools = config_dict['enabled_mcp_tools']
             self.enabled_mcp_tools = set(enabled_tools)
-            print(f"[AI] Enabled {len(self.enabled_mcp_tools)} MCP tools")
+            logger.debug("Enabled %s MCP tools", len(self.enabled_mcp_tools))
 
-        print(f"[AI] Configuration updated successfully, stream={self.stream}")
+        logger.debug("Configuration updated successfully, stream=%s", self.stream)
     
     def get_config(self) -> Dict:
         """获取当前配置字典（返回用户的原始 system_prompt，不包含硬编码的 Markdown 规范）"""
@@ -2305,19 +2772,20 @@ STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
             "max_iterations": self.max_iterations,
 
             # 工具配置
-            "mcp_paths": self._convert_paths_to_relative(self.mcp_paths.copy()),
+            "mcp_paths": self._convert_paths_to_relative(self.mcp_paths),
             "available_tools": list(self.funcs.keys()),
             "enabled_mcp_tools": list(self.enabled_mcp_tools)  # 保存已启用的工具
         }
 
     def _convert_paths_to_relative(self, paths: List[str]) -> List[str]:
         """将路径转换为相对路径格式(使用正斜杠)"""
+        cwd = os.getcwd()  # 所有路径共用一次 getcwd
         relative_paths = []
         for path in paths:
             # 转换为相对路径
             if os.path.isabs(path):
                 try:
-                    rel_path = os.path.relpath(path, os.getcwd())
+                    rel_path = os.path.relpath(path, cwd)
                 except ValueError:
                     # 如果无法计算相对路径,使用原始路径
                     rel_path = path
@@ -2325,10 +2793,10 @@ STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
                 rel_path = path
 
             # 统一使用正斜杠
-            rel_path = rel_path.replace('\\', '/')
+            rel_path = rel_path.translate(_SLASH_TRANS)
 
             # 如果不是以 ./ 开头的相对路径,添加 ./
-            if not rel_path.startswith('./') and not rel_path.startswith('../'):
+            if not rel_path.startswith(('./', '../')):
                 rel_path = './' + rel_path
 
             relative_paths.append(rel_path)
@@ -2337,15 +2805,16 @@ STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
     
     def get_execution_status(self) -> Dict:
         """获取当前执行状态用于状态栏显示"""
-        return self.execution_status.copy()
+        return dict(self.execution_status)
     
     def get_available_tools(self) -> List[Dict]:
-        """获取可用工具列表"""
-        tools = []
-        for func_name, func in self.funcs.items():
-            doc = func.__doc__ or "No description"
-            tools.append({"name": func_name, "description": doc})
-        return tools
+        """获取可用工具列表（缓存到工具集变化为止，返回列表和各条目的副本，调用方可以修改）"""
+        if self._tools_list_cache is None:
+            self._tools_list_cache = [
+                {"name": func_name, "description": func.__doc__ or "No description"}
+                for func_name, func in self.funcs.items()
+            ]
+        return [dict(t) for t in self._tools_list_cache]
     
     def print_tools_list(self):
         """打印可用工具列表"""
@@ -2359,15 +2828,15 @@ STRICTLY ENFORCE PROPER LINE BREAKS AND STRUCTURE IN EVERY RESPONSE."""
     def cleanup_mcp_servers(self):
         """清理所有 MCP server 进程"""
         if hasattr(self, 'mcp_managers') and self.mcp_managers:
-            print(f"[Info] Cleaning up {len(self.mcp_managers)} MCP servers...")
+            logger.info("Cleaning up %s MCP servers...", len(self.mcp_managers))
             for server_name, manager in self.mcp_managers.items():
                 try:
                     manager.stop()
-                    print(f"[Info] Stopped MCP server: {server_name}")
+                    logger.info("Stopped MCP server: %s", server_name)
                 except Exception as e:
-                    print(f"[Warning] Failed to stop server {server_name}: {e}")
+                    logger.warning("Failed to stop server %s: %s", server_name, e)
             self.mcp_managers.clear()
-            print("[Info] MCP servers cleanup complete")
+            logger.info("MCP servers cleanup complete")
 
     def __del__(self):
         """析构函数 - 确保 MCP servers 被正确关闭"""
@@ -2383,19 +2852,19 @@ def load_config_from_file(config_path: str) -> Optional[Dict]:
     try:
         with open(config_path, 'r', encoding='utf-8') as f:
             if config_path.endswith('.json'):
-                config = json.load(f)
+                config = loads_json(f.read())
             elif config_path.endswith('.yaml') or config_path.endswith('.yml'):
                 try:
                     import yaml
                     config = yaml.safe_load(f)
                 except ImportError:
-                    print("[Warning] PyYAML not installed. Install with: pip install pyyaml")
+                    logger.warning("PyYAML not installed. Install with: pip install pyyaml")
                     return None
             else:
                 raise ValueError("Unsupported config file format, supports JSON or YAML")
         return config
     except Exception as e:
-        print(f"[Error] Failed to load config file: {e}")
+        logger.error("Failed to load config file: %s", e)
         return None
 
 
@@ -2438,11 +2907,11 @@ def save_config_to_file(ai_instance: AI, config_path: str) -> bool:
     
     try:
         with open(config_path, 'w', encoding='utf-8') as f:
-            json.dump(config, f, ensure_ascii=False, indent=2)
-        print(f"[Info] Configuration saved to {config_path}")
+            f.write(_dumps_pretty(config))
+        logger.info("Configuration saved to %s", config_path)
         return True
     except Exception as e:
-        print(f"[Error] Failed to save configuration: {e}")
+        logger.error("Failed to save configuration: %s", e)
         return False
 
 
@@ -8,11 +8,14 @@ the AI assistant core logic, removing Qt UI dependencies.
 
 import os
 import sys
+import copy
+import functools
 import json
-import io
 import asyncio
-import zipfile
+import contextlib
 import logging
+import threading
+from collections import OrderedDict
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 from pathlib import Path
@@ -28,6 +31,7 @@ from aiclass import AI
 from utils.config_manager import ConfigManager
 from utils.ai_history_manager import AIHistoryManager
 from utils.chat_data_manager import ChatDataManager
+from utils.json_utils import read_json, write_json
 
 # ============================================================================
 # Configuration
@@ -142,37 +146,132 @@ chat_data_manager = ChatDataManager()
 # Store AI instances per conversation
 conversation_ais: Dict[str, AI] = {}
 conversation_configs: Dict[str, Dict] = {}
+# One lock per conversation so an AI instance is only built once at a time:
+# {conversation_id: [lock, users]}; an entry is removed once no request uses it
+_ai_build_locks: Dict[str, list] = {}
+
+# Parsed file caches per conversation: {conversation_id: ((mtime_ns, size), data)}
+# A changed mtime or size means the file was rewritten and is parsed again.
+# Both are LRU-bounded; settings are small, converted histories are not
+_CONFIG_CACHE_SIZE = 512
+_MESSAGES_CACHE_SIZE = 32
+_config_cache: "OrderedDict[str, tuple]" = OrderedDict()
+_messages_cache: "OrderedDict[str, tuple]" = OrderedDict()
+# The listing endpoint reads configs from worker threads
+_file_cache_lock = threading.Lock()
+
+# AI history role -> frontend (type, source); any other role is shown as system info
+_ROLE_TYPES = {"user": ("USER", "USER"), "assistant": ("AI", "AI")}
+_DEFAULT_ROLE_TYPE = ("INFO", "SYSTEM")
 
 # ============================================================================
 # Helper Functions
 # ============================================================================
 
+def _file_signature(path: Path) -> Optional[tuple]:
+    """Return (mtime_ns, size) for a file, or None if it does not exist"""
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def _cache_get(cache: OrderedDict, key: str) -> Optional[tuple]:
+    """Look up a file cache entry and mark it as recently used"""
+    with _file_cache_lock:
+        entry = cache.get(key)
+        if entry is not None:
+            cache.move_to_end(key)
+        return entry
+
+def _cache_put(cache: OrderedDict, key: str, entry: tuple, maxsize: int):
+    """Store a file cache entry, evicting the least recently used one when full"""
+    with _file_cache_lock:
+        cache[key] = entry
+        cache.move_to_end(key)
+        if len(cache) > maxsize:
+            cache.popitem(last=False)
+
+@functools.lru_cache(maxsize=512)
 def get_conversation_dir(conversation_id: str) -> Path:
-    """Get conversation directory - use ChatDataManager for consistency"""
+    """Get conversation directory - use ChatDataManager for consistency
+
+    The mapping only sanitizes the id and joins it to the data directory, so it is
+    memoized; it stays valid after a conversation is deleted or recreated.
+    """
     return chat_data_manager.get_chat_dir(conversation_id)
 
-def load_conversation_config(conversation_id: str) -> Dict:
-    """Load conversation configuration from disk"""
+def _read_conversation_config(conversation_id: str) -> Optional[Dict]:
+    """Return the cached parsed settings.json (shared, do not modify), or None if missing"""
     config_file = get_conversation_dir(conversation_id) / "settings.json"
-    if config_file.exists():
-        with open(config_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {}
+    signature = _file_signature(config_file)
+    if signature is None:
+        return None
+
+    cached = _cache_get(_config_cache, conversation_id)
+    if cached is None or cached[0] != signature:
+        cached = (signature, read_json(config_file))
+        _cache_put(_config_cache, conversation_id, cached, _CONFIG_CACHE_SIZE)
+    return cached[1]
+
+def load_conversation_config(conversation_id: str) -> Dict:
+    """Load conversation configuration from disk (parsed once per file change)"""
+    config = _read_conversation_config(conversation_id)
+    if config is None:
+        return {}
+
+    # Callers modify the returned config before saving it, so hand out a copy
+    return copy.deepcopy(config)
+
+def _listing_config(chat_name: str) -> Optional[Dict]:
+    """Settings shown in the conversation list (read-only)
+
+    Uses the settings.json cache and only falls back to config_manager for chats
+    that still use the legacy config file. An unreadable settings.json only hides
+    that chat's settings instead of failing the whole listing.
+    """
+    try:
+        config = _read_conversation_config(chat_name)
+    except (ValueError, OSError) as e:
+        logger.warning(f"Failed to read settings for {chat_name}: {e}")
+        return None
+    return config or config_manager.load_conversation_config(chat_name)
 
 def save_conversation_config(conversation_id: str, config: Dict):
     """Save conversation configuration to disk"""
     config_file = get_conversation_dir(conversation_id) / "settings.json"
     config_file.parent.mkdir(parents=True, exist_ok=True)
-    with open(config_file, 'w', encoding='utf-8') as f:
-        json.dump(config, f, indent=2, ensure_ascii=False)
+    write_json(config_file, config)
+    _cache_put(_config_cache, conversation_id, (_file_signature(config_file), copy.deepcopy(config)), _CONFIG_CACHE_SIZE)
+
+@contextlib.asynccontextmanager
+async def _ai_build_lock(conversation_id: str):
+    """Hold the conversation's build lock
+
+    The lock is dropped once its last user leaves (after a build, a failed build or a
+    delete), so ids that were requested once do not keep a lock forever. Requests still
+    waiting keep the entry alive, so a new request never gets a second lock alongside them.
+    """
+    entry = _ai_build_locks.get(conversation_id)
+    if entry is None:
+        entry = _ai_build_locks[conversation_id] = [asyncio.Lock(), 0]
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0 and _ai_build_locks.get(conversation_id) is entry:
+            del _ai_build_locks[conversation_id]
 
 def load_api_key(conversation_id: str) -> str:
     """Load API key from .confignore file"""
     confignore_file = get_conversation_dir(conversation_id) / ".confignore"
-    if confignore_file.exists():
-        with open(confignore_file, 'r', encoding='utf-8') as f:
-            return f.read().strip()
-    return os.environ.get("DEEPSEEK_API_KEY", os.environ.get("OPENAI_API_KEY", ""))
+    try:
+        # Read directly instead of exists() + open(): one lookup fewer per call
+        return confignore_file.read_text(encoding='utf-8').strip()
+    except FileNotFoundError:
+        return os.environ.get("DEEPSEEK_API_KEY", os.environ.get("OPENAI_API_KEY", ""))
 
 def save_api_key(conversation_id: str, api_key: str):
     """Save API key to .confignore file"""
@@ -181,85 +280,110 @@ def save_api_key(conversation_id: str, api_key: str):
     with open(confignore_file, 'w', encoding='utf-8') as f:
         f.write(api_key)
 
-def get_ai_instance(conversation_id: str) -> Optional[AI]:
-    """Get or create AI instance for conversation"""
-    if conversation_id in conversation_ais:
-        return conversation_ais[conversation_id]
+async def get_ai_instance(conversation_id: str) -> Optional[AI]:
+    """Get or create AI instance for conversation
 
-    # Load configuration
-    config = load_conversation_config(conversation_id)
-    api_key = load_api_key(conversation_id)
+    Creating an instance loads tools and may start MCP server processes, so it runs
+    in a worker thread; concurrent requests for the same conversation wait on one
+    build instead of each creating (and leaking) their own instance.
+    """
+    ai_instance = conversation_ais.get(conversation_id)
+    if ai_instance is not None:
+        return ai_instance
 
-    if not api_key:
-        return None
+    async with _ai_build_lock(conversation_id):
+        # Another request may have finished the build while this one was waiting
+        ai_instance = conversation_ais.get(conversation_id)
+        if ai_instance is not None:
+            return ai_instance
 
-    # Create AI instance
-    try:
-        ai_kwargs = {
-            'api_key': api_key,
-            'api_base': config.get('api_base', 'https://api.deepseek.com'),
-            'model': config.get('model', 'deepseek-chat'),
-            'temperature': config.get('temperature', 1.0),
-            'max_tokens': config.get('max_tokens'),
-            'top_p': config.get('top_p', 1.0),
-            'stream': config.get('stream', True),
-            'command_start': config.get('command_start', 'YLDEXECUTE:'),
-            'command_separator': config.get('command_separator', '￥|'),
-            'max_iterations': config.get('max_iterations', 15),
-            'mcp_paths': config.get('mcp_paths', []),
-            'system_prompt': config.get('system_prompt', ''),
-            'chat_name': conversation_id
-        }
+        # Load configuration
+        config = load_conversation_config(conversation_id)
+        api_key = load_api_key(conversation_id)
+
+        if not api_key:
+            return None
+
+        # Create AI instance
+        try:
+            ai_kwargs = {
+                'api_key': api_key,
+                'api_base': config.get('api_base', 'https://api.deepseek.com'),
+                'model': config.get('model', 'deepseek-chat'),
+                'temperature': config.get('temperature', 1.0),
+                'max_tokens': config.get('max_tokens'),
+                'top_p': config.get('top_p', 1.0),
+                'stream': config.get('stream', True),
+                'command_start': config.get('command_start', 'YLDEXECUTE:'),
+                'command_separator': config.get('command_separator', '￥|'),
+                'max_iterations': config.get('max_iterations', 15),
+                'mcp_paths': config.get('mcp_paths', []),
+                'system_prompt': config.get('system_prompt', ''),
+                'chat_name': conversation_id
+            }
 
-        # Remove None values
-        ai_kwargs = {k: v for k, v in ai_kwargs.items() if v is not None and v != ''}
+            # Remove None values
+            ai_kwargs = {k: v for k, v in ai_kwargs.items() if v is not None and v != ''}
 
-        ai_instance = AI(**ai_kwargs)
-        conversation_ais[conversation_id] = ai_instance
-        conversation_configs[conversation_id] = config
+            ai_instance = await asyncio.to_thread(AI, **ai_kwargs)
+            conversation_ais[conversation_id] = ai_instance
+            conversation_configs[conversation_id] = config
 
-        return ai_instance
-    except Exception as e:
-        logger.error(f"Failed to create AI instance: {e}")
-        return None
+            return ai_instance
+        except Exception as e:
+            logger.error(f"Failed to create AI instance: {e}")
+            return None
+
+async def _invalidate_ai_instance(conversation_id: str):
+    """Drop the cached AI instance so the next request rebuilds it from the saved config
+
+    Runs under the build lock: a build that started before the new config was saved
+    finishes first and its stale instance is dropped here, instead of being cached
+    right after an unguarded pop.
+    """
+    async with _ai_build_lock(conversation_id):
+        ai_instance = conversation_ais.pop(conversation_id, None)
+        if ai_instance is not None:
+            # Release the instance's async connection pool along with it
+            await ai_instance.aclose()
 
 def get_message_file(conversation_id: str) -> Path:
     """Get message file path for conversation"""
     return get_conversation_dir(conversation_id) / f"{conversation_id}_ai.json"
 
 def load_messages(conversation_id: str) -> List[Dict]:
-    """Load messages from disk and convert to frontend format"""
+    """Load messages from disk and convert to frontend format
+
+    The converted list is cached until the history file changes; callers only read it.
+    """
+    signature = _file_signature(chat_data_manager.get_ai_history_path(conversation_id))
+    cached = _cache_get(_messages_cache, conversation_id)
+    if signature is not None and cached is not None and cached[0] == signature:
+        return cached[1]
+
     # Load AI history format: [{"role": "user/assistant", "content": "...", "timestamp": "..."}]
     ai_history = history_manager.load_history(conversation_id)
 
-    # Convert to frontend message format
+    # Convert to frontend message format; messages without a stored timestamp
+    # all get the same load time
+    now = datetime.now().isoformat()
     messages = []
     for idx, msg in enumerate(ai_history):
-        role = msg.get("role", "")
-        content = msg.get("content", "")
-        timestamp = msg.get("timestamp")  # Get timestamp from AI history if available
-
         # Map role to type and source
-        if role == "user":
-            msg_type = "USER"
-            source = "USER"
-        elif role == "assistant":
-            msg_type = "AI"
-            source = "AI"
-        else:
-            msg_type = "INFO"
-            source = "SYSTEM"
+        msg_type, source = _ROLE_TYPES.get(msg.get("role", ""), _DEFAULT_ROLE_TYPE)
 
         messages.append({
             "id": f"msg-{idx}",
-            "content": content,
+            "content": msg.get("content", ""),
             "type": msg_type,
             "source": source,
-            "timestamp": timestamp if timestamp else datetime.now().isoformat(),
+            "timestamp": msg.get("timestamp") or now,
             "conversationId": conversation_id,
             "isStreaming": False
         })
 
+    if signature is not None:
+        _cache_put(_messages_cache, conversation_id, (signature, messages), _MESSAGES_CACHE_SIZE)
     return messages
 
 def save_messages(conversation_id: str, messages: List[Dict]):
@@ -297,10 +421,21 @@ async def get_all_conversations():
         chat_list_names = config_manager.load_chat_list()
         chat_records = config_manager.load_chat_history()
 
+        # Check every conversation's settings file in worker threads so the disk
+        # access overlaps instead of running one after another on the event loop;
+        # unchanged files come from the settings cache without being parsed again
+        configs = await asyncio.gather(*(
+            asyncio.to_thread(_listing_config, chat_name)
+            for chat_name in chat_list_names
+        ))
+
+        # Fallback timestamp for chats without one, shared by the whole listing
+        now = datetime.now().isoformat()
+
         conversations = []
-        for chat_name in chat_list_names:
+        for chat_name, config in zip(chat_list_names, configs):
             # Get conversation config
-            config = config_manager.load_conversation_config(chat_name) or {}
+            config = config or {}
 
             # Get messages
             messages = chat_records.get(chat_name, [])
@@ -317,8 +452,8 @@ async def get_all_conversations():
             conversations.append({
                 "id": chat_name,
                 "name": config.get("name", chat_name),
-                "createdAt": config.get("createdAt", datetime.now().isoformat()),
-                "updatedAt": config.get("updatedAt", datetime.now().isoformat()),
+                "createdAt": config.get("createdAt", now),
+                "updatedAt": config.get("updatedAt", now),
                 "messageCount": len(messages),
                 "lastMessage": last_message
             })
@@ -338,12 +473,13 @@ async def get_conversation(conversation_id: str):
 
         config = load_conversation_config(conversation_id)
         messages = load_messages(conversation_id)
+        now = datetime.now().isoformat()
 
         return {
             "id": conversation_id,
             "name": config.get("name", conversation_id),
-            "createdAt": config.get("createdAt", datetime.now().isoformat()),
-            "updatedAt": config.get("updatedAt", datetime.now().isoformat()),
+            "createdAt": config.get("createdAt", now),
+            "updatedAt": config.get("updatedAt", now),
             "messageCount": len(messages),
             "lastMessage": messages[-1].get("content", "") if messages else None
         }
@@ -440,11 +576,14 @@ async def delete_conversation(conversation_id: str):
         if not conv_dir.exists():
             raise HTTPException(status_code=404, detail="Conversation not found")
 
-        # Remove AI instance from cache
-        if conversation_id in conversation_ais:
-            del conversation_ais[conversation_id]
-        if conversation_id in conversation_configs:
-            del conversation_configs[conversation_id]
+        # Remove AI instance from cache; waits for an in-flight build so it cannot
+        # cache an instance for the deleted conversation afterwards. The build lock
+        # entry is dropped once no request is waiting on it
+        await _invalidate_ai_instance(conversation_id)
+        conversation_configs.pop(conversation_id, None)
+        with _file_cache_lock:
+            _config_cache.pop(conversation_id, None)
+            _messages_cache.pop(conversation_id, None)
 
         # Delete chat folder using chat_data_manager (this removes all data)
         success = chat_data_manager.delete_chat_folder(conversation_id)
@@ -471,7 +610,7 @@ async def clear_conversation_messages(conversation_id: str):
     """Clear all messages in a conversation"""
     try:
         # Get AI instance to obtain system prompt
-        ai = get_ai_instance(conversation_id)
+        ai = await get_ai_instance(conversation_id)
         system_prompt = ai.system_prompt if ai else None
 
         # Use history_manager.clear_history() to preserve system prompt
@@ -505,11 +644,12 @@ async def get_messages(conversation_id: str):
 async def message_generator(ai: AI, user_message: str, conversation_id: str):
     """Generate streaming response"""
     try:
-        current_time = datetime.now().isoformat()
+        started_at = datetime.now()
+        current_time = started_at.isoformat()
 
         # Create user message
         user_msg = {
-            "id": f"msg-{int(datetime.now().timestamp() * 1000)}",
+            "id": f"msg-{int(started_at.timestamp() * 1000)}",
             "content": user_message,
             "type": "USER",
             "source": "USER",
@@ -538,7 +678,7 @@ async def message_generator(ai: AI, user_message: str, conversation_id: str):
 
         # Stream AI response
         full_response = ""
-        message_id = f"msg-{int(datetime.now().timestamp() * 1000) + 1}"
+        message_id = f"msg-{int(started_at.timestamp() * 1000) + 1}"
 
         # Process with streaming - CRITICAL: pass conversation_history
         # This ensures AI has proper context with system prompt
@@ -553,13 +693,16 @@ async def message_generator(ai: AI, user_message: str, conversation_id: str):
         # aiclass.process_user_input_stream updates ai.conv_his internally
         updated_history = ai.conv_his.copy() if hasattr(ai, 'conv_his') and ai.conv_his else conversation_history
 
+        # Reply time, also used as the conversation's new updatedAt
+        finished_time = datetime.now().isoformat()
+
         # Create AI message
         ai_msg = {
             "id": message_id,
             "content": full_response,
             "type": "AI",
             "source": "AI",
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": finished_time,
             "conversationId": conversation_id,
             "isStreaming": False
         }
@@ -574,7 +717,7 @@ async def message_generator(ai: AI, user_message: str, conversation_id: str):
 
         # Update conversation timestamp
         config = load_conversation_config(conversation_id)
-        config["updatedAt"] = datetime.now().isoformat()
+        config["updatedAt"] = finished_time
         save_conversation_config(conversation_id, config)
 
         # Send complete event - EventSourceResponse requires JSON-encoded string for 'data'
@@ -588,7 +731,7 @@ async def message_generator(ai: AI, user_message: str, conversation_id: str):
 async def stream_message(conversation_id: str, data: SendMessageModel):
     """Send message with streaming response (SSE)"""
     try:
-        ai = get_ai_instance(conversation_id)
+        ai = await get_ai_instance(conversation_id)
         if not ai:
             raise HTTPException(status_code=400, detail="AI not initialized. Please configure API key first.")
 
@@ -606,7 +749,7 @@ async def stream_message(conversation_id: str, data: SendMessageModel):
 async def send_message(conversation_id: str, data: SendMessageModel):
     """Send message (non-streaming)"""
     try:
-        ai = get_ai_instance(conversation_id)
+        ai = await get_ai_instance(conversation_id)
         if not ai:
             raise HTTPException(status_code=400, detail="AI not initialized")
 
@@ -636,12 +779,13 @@ async def send_message(conversation_id: str, data: SendMessageModel):
         history_manager.save_history(conversation_id, updated_history)
 
         # Return in frontend format
+        finished_at = datetime.now()
         ai_msg = {
-            "id": f"msg-{int(datetime.now().timestamp() * 1000) + 1}",
+            "id": f"msg-{int(finished_at.timestamp() * 1000) + 1}",
             "content": response,
             "type": "AI",
             "source": "AI",
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": finished_at.isoformat(),
             "conversationId": conversation_id,
             "isStreaming": False
         }
@@ -658,7 +802,7 @@ async def stop_streaming(conversation_id: str):
     """Stop streaming response and kill any running command processes"""
     try:
         # Get AI instance for this conversation
-        ai = get_ai_instance(conversation_id)
+        ai = await get_ai_instance(conversation_id)
         if ai:
             # Set stop flag to stop streaming
             ai.set_stop_flag(True)
@@ -769,8 +913,7 @@ async def update_settings(conversation_id: str, data: UpdateSettingsModel):
         save_conversation_config(conversation_id, config)
 
         # Recreate AI instance with new settings
-        if conversation_id in conversation_ais:
-            del conversation_ais[conversation_id]
+        await _invalidate_ai_instance(conversation_id)
 
         # Return converted config for frontend (must await!)
         return await get_settings(conversation_id)
@@ -810,7 +953,7 @@ async def get_mcp_tools(conversation: Optional[str] = None):
         if not conversation:
             return []
 
-        ai = get_ai_instance(conversation)
+        ai = await get_ai_instance(conversation)
         if not ai:
             return []
 
@@ -906,8 +1049,7 @@ async def upload_mcp_tools(conversation_id: str, files: List[UploadFile] = File(
             save_conversation_config(conversation_id, config)
 
             # Recreate AI instance to reload tools
-            if conversation_id in conversation_ais:
-                del conversation_ais[conversation_id]
+            await _invalidate_ai_instance(conversation_id)
 
         return {
             "success": True,
@@ -954,7 +1096,9 @@ async def export_config(conversation_id: str):
         logger.info(f"[Export] Export config request for conversation_id: {conversation_id}")
         logger.info(f"[Export] conversation_id type: {type(conversation_id)}")
 
+        # Only the import/export endpoints need these, so they load on first use
         import io
+        import zipfile
 
         # Create ZIP in memory
         zip_buffer = io.BytesIO()
@@ -1035,6 +1179,9 @@ async def import_config(
 ):
     """Import conversation configuration from ZIP"""
     try:
+        import io
+        import zipfile
+
         # Read ZIP file
         zip_data = await file.read()
 
@@ -1053,12 +1200,13 @@ async def import_config(
             if f"{root_folder}/settings.json" in files:
                 settings_data = json.loads(zipf.read(f"{root_folder}/settings.json"))
 
-            # Create new conversation
-            conv_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+            # Create new conversation (id and timestamps come from the same moment)
+            created = datetime.now()
+            conv_id = created.strftime("%Y%m%d_%H%M%S")
             conv_dir = get_conversation_dir(conv_id)
             conv_dir.mkdir(parents=True, exist_ok=True)
 
-            now = datetime.now().isoformat()
+            now = created.isoformat()
 
             # Save settings
             if settings_data:
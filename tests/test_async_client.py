@@ -0,0 +1,175 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from aiclass import AI
+
+
+class FakeCompletions:
+    """Records requests and answers them from a queue of replies"""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.requests = []
+
+    async def create(self, **params):
+        self.requests.append(params)
+        reply = self.replies.pop(0)
+        if params.get("stream"):
+            return FakeStream(reply)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=reply))])
+
+
+class FakeStream:
+    """Async stream yielding one chunk per element of reply"""
+
+    def __init__(self, reply):
+        self.pieces = list(reply)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.pieces:
+            raise StopAsyncIteration
+        content = self.pieces.pop(0)
+        return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+    async def close(self):
+        self.pieces = []
+
+
+class FakeAsyncClient:
+    def __init__(self, replies=()):
+        self.completions = FakeCompletions(replies)
+        self.chat = SimpleNamespace(completions=self.completions)
+        self.closed_on = None
+
+    async def close(self):
+        self.closed_on = asyncio.get_running_loop()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+@pytest.fixture
+def ai(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return AI(api_key="sk-test", mcp_paths=[])
+
+
+@pytest.fixture
+def clients(monkeypatch):
+    """Replace the real AsyncOpenAI client; tests set .replies before a client is created"""
+    created = []
+    state = SimpleNamespace(created=created, replies=[])
+
+    def new_async_client(self):
+        client = FakeAsyncClient(state.replies)
+        created.append(client)
+        return client
+
+    monkeypatch.setattr(AI, "_new_async_client", new_async_client)
+    return state
+
+
+def test_async_client_reused_within_one_loop(ai, clients):
+    async def run():
+        return ai._get_async_client(), ai._get_async_client()
+
+    first, second = asyncio.run(run())
+    assert first is second
+    assert len(clients.created) == 1
+
+
+def test_async_client_rebuilt_on_new_loop(ai, clients):
+    async def run():
+        client = ai._get_async_client()
+        # Let a close scheduled for the previous client run on this loop
+        await asyncio.sleep(0)
+        return client
+
+    first = asyncio.run(run())
+    second = asyncio.run(run())
+    assert first is not second
+    assert first.closed_on is not None
+    assert second.closed_on is None
+    assert not ai._aclient_close_tasks
+
+
+def test_aclose_on_owner_loop(ai, clients):
+    async def run():
+        client = ai._get_async_client()
+        await ai.aclose()
+        return client, asyncio.get_running_loop()
+
+    client, loop = asyncio.run(run())
+    assert client.closed_on is loop
+    assert ai.aclient is None
+
+
+def test_aclose_from_other_loop(ai, clients):
+    async def create():
+        return ai._get_async_client()
+
+    async def close():
+        await ai.aclose()
+        await asyncio.sleep(0)
+
+    client = asyncio.run(create())
+    asyncio.run(close())
+    assert client.closed_on is not None
+    assert ai.aclient is None
+    assert not ai._aclient_close_tasks
+
+
+def test_achat_round_trip(ai, clients):
+    clients.replies = ["hello"]
+    messages = [{"role": "user", "content": "hi"}]
+
+    assert asyncio.run(ai.achat(messages)) == "hello"
+    request = clients.created[0].completions.requests[0]
+    assert request["messages"] == messages
+    assert request["model"] == ai.model
+    assert request["stream"] is False
+
+
+def test_abatch_keeps_input_order(ai, clients):
+    clients.replies = ["a", "b", "c"]
+    batches = [[{"role": "user", "content": str(i)}] for i in range(3)]
+
+    assert asyncio.run(ai.abatch(batches, max_concurrency=2)) == ["a", "b", "c"]
+
+
+def test_batch_closes_its_client(ai, clients):
+    clients.replies = ["a", "b"]
+    batches = [[{"role": "user", "content": str(i)}] for i in range(2)]
+
+    assert ai.batch(batches) == ["a", "b"]
+    assert clients.created[0].closed_on is not None
+    assert ai.aclient is None
+
+
+def test_aprocess_user_inp_runs_command(ai, clients, monkeypatch):
+    calls = []
+    monkeypatch.setitem(ai.funcs, "echo", lambda text: calls.append(text) or f"Execution successful: {text}")
+    clients.replies = [f"{ai.command_start} echo {ai.command_separator} hi", "All done."]
+    sent = []
+
+    async def callback(text):
+        sent.append(text)
+
+    async def run():
+        return [text async for text in ai.aprocess_user_inp("say hi", callback)]
+
+    asyncio.run(run())
+    assert calls == ["hi"]
+    output = "".join(sent)
+    assert "**Command Execution Result**" in output
+    assert output.endswith("All done.")
+    assert [m["role"] for m in ai.conv_his[-4:]] == ["user", "assistant", "user", "assistant"]
+    assert ai.conv_his[-1]["content"] == "All done."
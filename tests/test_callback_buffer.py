@@ -0,0 +1,61 @@
+import aiclass
+from aiclass import _CallbackBuffer, _CommandScanner
+
+CMD_START = "YLDEXECUTE:"
+
+
+def _stream(chunks, cmd_start=CMD_START):
+    """Feed chunks through the scanner and buffer the way the stream loops do"""
+    scanner = _CommandScanner(cmd_start)
+    buffer = _CallbackBuffer(cmd_start)
+    sent = []
+    for content in chunks:
+        scanner.feed(content)
+        text = buffer.add(content, scanner.offset)
+        if text:
+            sent.append(text)
+    rest = buffer.drain()
+    if rest:
+        sent.append(rest)
+    return sent
+
+
+def _assert_marker_starts_callback(sent, cmd_start=CMD_START):
+    assert "".join(sent).count(cmd_start) == 1
+    marked = [text for text in sent if cmd_start in text]
+    assert len(marked) == 1
+    assert marked[0].startswith(cmd_start)
+    # No earlier callback ends with the beginning of the marker
+    before = sent[:sent.index(marked[0])]
+    assert not any(text.endswith(cmd_start[:i]) for text in before for i in range(1, len(cmd_start)))
+
+
+def test_marker_split_across_chunks():
+    chunks = ["Let me run it. YLDEX", "ECUTE: tool ￥| arg\n", "more"]
+    sent = _stream(chunks)
+    assert "".join(sent) == "".join(chunks)
+    _assert_marker_starts_callback(sent)
+
+
+def test_marker_split_across_size_flush(monkeypatch):
+    monkeypatch.setattr(aiclass, "_CALLBACK_FLUSH_CHARS", 8)
+    chunks = ["some leading text YLDEXEC", "UTE: tool ￥| arg\n"]
+    sent = _stream(chunks)
+    assert "".join(sent) == "".join(chunks)
+    # The size flush before the marker keeps the partial marker back
+    assert not sent[0].endswith("YLDEXEC")
+    _assert_marker_starts_callback(sent)
+
+
+def test_marker_split_across_time_flush(monkeypatch):
+    monkeypatch.setattr(aiclass, "_CALLBACK_FLUSH_INTERVAL", 0)
+    chunks = ["ab", "cY", "LDE", "XECUTE", ": tool\n", "tail"]
+    sent = _stream(chunks)
+    assert "".join(sent) == "".join(chunks)
+    _assert_marker_starts_callback(sent)
+
+
+def test_text_without_marker_is_sent_in_full(monkeypatch):
+    monkeypatch.setattr(aiclass, "_CALLBACK_FLUSH_INTERVAL", 0)
+    chunks = ["plain ", "answer ", "text"]
+    assert "".join(_stream(chunks)) == "plain answer text"
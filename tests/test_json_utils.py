@@ -0,0 +1,61 @@
+import os
+import stat
+
+from utils import json_utils
+from utils.json_utils import read_json, write_json
+
+
+def test_write_json_round_trip(tmp_path):
+    target = tmp_path / "settings.json"
+    write_json(target, {"name": "对话", "n": 1})
+    assert read_json(target) == {"name": "对话", "n": 1}
+    assert os.listdir(tmp_path) == ["settings.json"]
+
+
+def test_write_json_new_file_mode(tmp_path):
+    target = tmp_path / "settings.json"
+    write_json(target, {})
+    assert stat.S_IMODE(os.stat(target).st_mode) == 0o644
+
+
+def test_write_json_keeps_existing_mode(tmp_path):
+    target = tmp_path / "settings.json"
+    target.write_text("{}")
+    os.chmod(target, 0o600)
+    write_json(target, {"a": 1})
+    assert stat.S_IMODE(os.stat(target).st_mode) == 0o600
+    assert read_json(target) == {"a": 1}
+
+
+def test_write_json_retries_locked_target(tmp_path, monkeypatch):
+    target = tmp_path / "settings.json"
+    target.write_text("{}")
+    real_replace = os.replace
+    calls = []
+
+    def flaky_replace(src, dst):
+        calls.append(src)
+        if len(calls) < 3:
+            raise PermissionError("file is in use")
+        real_replace(src, dst)
+
+    monkeypatch.setattr(json_utils.os, "replace", flaky_replace)
+    monkeypatch.setattr(json_utils, "_REPLACE_RETRY_DELAY", 0)
+    write_json(target, {"a": 1})
+    assert len(calls) == 3
+    assert read_json(target) == {"a": 1}
+    assert os.listdir(tmp_path) == ["settings.json"]
+
+
+def test_write_json_falls_back_to_in_place_write(tmp_path, monkeypatch):
+    target = tmp_path / "settings.json"
+    target.write_text("{}")
+
+    def locked_replace(src, dst):
+        raise PermissionError("file is in use")
+
+    monkeypatch.setattr(json_utils.os, "replace", locked_replace)
+    monkeypatch.setattr(json_utils, "_REPLACE_RETRY_DELAY", 0)
+    write_json(target, {"a": 1})
+    assert read_json(target) == {"a": 1}
+    assert os.listdir(tmp_path) == ["settings.json"]
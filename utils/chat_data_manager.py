@@ -5,12 +5,16 @@ Each chat has its own folder containing settings, history, and MCP tools
 """
 
 import os
-import json
 import pickle
 import shutil
 from pathlib import Path
 from typing import Dict, List, Optional
 
+from utils.json_utils import read_json, write_json
+
+# Normalizes backslashes to forward slashes in stored MCP paths
+_SLASH_TRANS = str.maketrans('\\', '/')
+
 
 class ChatDataManager:
     """
@@ -287,17 +291,17 @@ class ChatDataManager:
             return None
 
         try:
-            with open(settings_path, 'r', encoding='utf-8') as f:
-                settings = json.load(f)
+            settings = read_json(settings_path)
 
             # Convert MCP paths to relative paths with forward slashes
             if 'mcp_paths' in settings:
+                cwd = os.getcwd()
                 relative_paths = []
                 for path in settings['mcp_paths']:
                     # 转换为相对路径
                     if os.path.isabs(path):
                         try:
-                            rel_path = os.path.relpath(path, os.getcwd())
+                            rel_path = os.path.relpath(path, cwd)
                         except ValueError:
                             # 如果无法计算相对路径,使用原始路径
                             rel_path = path
@@ -305,10 +309,10 @@ class ChatDataManager:
                         rel_path = path
 
                     # 统一使用正斜杠
-                    rel_path = rel_path.replace('\\', '/')
+                    rel_path = rel_path.translate(_SLASH_TRANS)
 
                     # 如果不是以 ./ 开头的相对路径,添加 ./
-                    if not rel_path.startswith('./') and not rel_path.startswith('../'):
+                    if not rel_path.startswith(('./', '../')):
                         rel_path = './' + rel_path
 
                     relative_paths.append(rel_path)
@@ -339,8 +343,7 @@ class ChatDataManager:
             del safe_settings['ai_config']['api_key']
 
         try:
-            with open(settings_path, 'w', encoding='utf-8') as f:
-                json.dump(safe_settings, f, indent=2, ensure_ascii=False)
+            write_json(settings_path, safe_settings)
             return True
         except Exception as e:
             print(f"[ChatData] Failed to save settings: {e}")
@@ -388,8 +391,7 @@ class ChatDataManager:
             return None
 
         try:
-            with open(ai_history_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return read_json(ai_history_path)
         except Exception as e:
             print(f"[ChatData] Failed to load AI history: {e}")
             return None
@@ -403,8 +405,8 @@ class ChatDataManager:
         ai_history_path = self.get_ai_history_path(chat_name)
 
         try:
-            with open(ai_history_path, 'w', encoding='utf-8') as f:
-                json.dump(history, f, ensure_ascii=False, indent=2)
+            # Only the program reads the AI history, so it is stored compact
+            write_json(ai_history_path, history, pretty=False)
             return True
         except Exception as e:
             print(f"[ChatData] Failed to save AI history: {e}")
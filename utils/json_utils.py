@@ -0,0 +1,88 @@
+# [file name]: utils/json_utils.py
+"""
+JSON helpers shared by the chat data manager, the API server and the AI core
+Uses orjson when it is installed and falls back to the standard json module
+"""
+
+import json
+import os
+import stat
+import tempfile
+import time
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the standard json module
+    orjson = None
+
+# Windows refuses to replace a file another handle has open (e.g. a reader thread);
+# write_json retries briefly and then writes the file in place
+_REPLACE_RETRIES = 5
+_REPLACE_RETRY_DELAY = 0.02
+
+
+def loads_json(raw):
+    """Parse JSON from bytes or str"""
+    return orjson.loads(raw) if orjson else json.loads(raw)
+
+
+def dumps_json(data, pretty: bool = True) -> bytes:
+    """Serialize data as UTF-8 JSON bytes, keeping non-ASCII characters
+
+    pretty=False produces compact JSON for data that is only read by the program.
+    """
+    if orjson:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+        try:
+            return orjson.dumps(data, option=option)
+        except TypeError:
+            pass  # Types orjson cannot serialize (e.g. very large ints) go through json
+    if pretty:
+        return json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def read_json(path):
+    """Read and parse a JSON file"""
+    with open(path, 'rb') as f:
+        return loads_json(f.read())
+
+
+def write_json(path, data, pretty: bool = True) -> None:
+    """Write data to a file as UTF-8 JSON
+
+    The payload goes to a temporary file in the same directory which then replaces
+    the target, so readers never see a half-written file. The new file keeps the
+    target's permissions, or gets 0644 if the target does not exist yet.
+    """
+    payload = dumps_json(data, pretty)
+    directory, name = os.path.split(os.path.abspath(path))
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = 0o644
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        os.chmod(tmp_path, mode)
+        _replace(tmp_path, path, payload)
+    finally:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass  # Already moved into place
+
+
+def _replace(tmp_path, path, payload: bytes) -> None:
+    """Move tmp_path onto path, writing payload in place if the target stays locked"""
+    for attempt in range(_REPLACE_RETRIES):
+        try:
+            os.replace(tmp_path, path)
+            return
+        except PermissionError:
+            if attempt + 1 < _REPLACE_RETRIES:
+                time.sleep(_REPLACE_RETRY_DELAY)
+    # The target is still held open: a plain write is not atomic but does not fail
+    with open(path, 'wb') as f:
+        f.write(payload)